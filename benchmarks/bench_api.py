@@ -0,0 +1,249 @@
+"""
+Benchmark suite of the REST API: seeds a synthetic catalog, drives every route of src/app.py through the Flask
+test client and a gunicorn server, and saves throughput, latency percentiles, SQL queries per request and peak
+RSS per scenario as JSON. The compare command flags the regressions between two result files.
+
+    python benchmarks/bench_api.py run --items 3000 --users 300 --favorites 10 --output results.json
+    python benchmarks/bench_api.py run --mode test_client --only items_list,user_favorites --output new.json
+    python benchmarks/bench_api.py compare results.json new.json --threshold 0.10
+
+The database comes from BENCH_DATABASE_URL (a throw away sqlite file by default, see dataset.py), never from the
+DATABASE_URL of the app. The catalog is seeded again before each mode so the write scenarios start from the same
+state. The response cache is off unless --cache.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+# Scenarios: name -> (requests, read_only). A request is a path to GET or a (method, path, json body) tuple,
+# the list is sent round robin. The write scenarios only use the rows seeded for them.
+def scenarios(args):
+    characters = ['/people/character-%07d' % i for i in range(0, args.per_type, max(1, args.per_type // 50))]
+    planets = ['/planets/planet-%07d' % i for i in range(0, args.per_type, max(1, args.per_type // 50))]
+    vehicles = ['/vehicles/vehicle-%07d' % i for i in range(0, args.per_type, max(1, args.per_type // 50))]
+    item_ids = [path.rsplit('/', 1)[1] for path in characters + planets + vehicles]
+    users = range(1, args.users + 1, max(1, args.users // 50)) if args.users else []
+    new_planet = {'type': 'planet', 'name': 'Bench planet', 'climate': 'arid', 'terrain': 'desert',
+                  'population': 1000, 'orbital_period': 300, 'rotation_period': 24}
+    edited = dict(new_planet, id='planet-0000000', name='Edited planet')
+    # the last vehicles are deleted one by one, a request after they are all gone is a 404 and still timed
+    deleted = [('DELETE', '/items', {'id': 'vehicle-%07d' % i})
+               for i in range(args.per_type - 1, max(-1, args.per_type - 1 - args.deletions), -1)]
+    favorite = 'character-0000000'
+    return {
+        'sitemap': (['/'], True),
+        'items_all': (['/items'], True),
+        'items_list': (['/items?limit=50'], True),
+        'items_selectin': (['/items?limit=50&load=selectin'], True),
+        'items_joined': (['/items?limit=50&load=joined'], True),
+        'items_fields': (['/items?limit=50&fields=name,type'], True),
+        'items_search': (['/items?search=planet%201&limit=20'], True),
+        'items_ids': (['/items?ids=' + ','.join(item_ids[::10])], True),
+        'items_batch': ([('POST', '/items/batch', {'ids': item_ids})], True),
+        'items_popular': (['/items/popular?limit=10', '/items/popular?type=planet&limit=10'], True),
+        'people_list': (['/people?limit=50'], True),
+        'planets_list': (['/planets?limit=50&sort=-favorite_count', '/planets?climate=arid&limit=50'], True),
+        'vehicles_list': (['/vehicles?limit=50&passengers_min=10&passengers_max=100'], True),
+        'character_detail': (characters, True),
+        'planet_detail': (planets, True),
+        'vehicle_detail': (vehicles, True),
+        'users_list': (['/users?limit=50&include=favorites'], True),
+        'user_favorites': (['/users/%d/favorites' % user for user in users] or ['/users/1/favorites'], True),
+        'user_favorites_expand': (['/users/%d/favorites?expand=items&limit=20' % user for user in users]
+                                  or ['/users/1/favorites?expand=items'], True),
+        'favorites_legacy': ([('GET', '/users/favorites', {'user_id': user}) for user in users]
+                             or [('GET', '/users/favorites', {'user_id': 1})], True),
+        'changes': (['/changes?limit=100', '/changes?limit=100&user_id=1', '/changes?since=latest'], True),
+        'cache_stats': (['/cache/stats'], True),
+        'item_create': ([('POST', '/items', new_planet)], False),
+        'item_bulk': ([('POST', '/items/bulk', [new_planet] * 100)], False),
+        'item_update': ([('PUT', '/items', edited)], False),
+        'item_delete': (deleted or [('DELETE', '/items', {'id': 'missing'})], False),
+        'favorite_add_remove': ([('POST', '/users/favorites/', {'user_id': 1, 'item_id': favorite}),
+                                 ('DELETE', '/users/favorites/', {'user_id': 1, 'item_id': favorite})], False),
+        'favorites_patch': ([('PATCH', '/users/1/favorites', {'add': [favorite]}),
+                             ('PATCH', '/users/1/favorites', {'remove': [favorite]})], False),
+        'favorites_put': ([('PUT', '/users/2/favorites', {'item_ids': ['planet-0000001', 'vehicle-0000001']})],
+                          False),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_test_client(app, requests, duration):
+    import loadgen
+    client = app.test_client()
+    latencies, queries, errors = [], [], 0
+    index = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        method, path, body = loadgen.request_spec(requests[index % len(requests)])
+        index += 1
+        began = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        latencies.append(time.perf_counter() - began)
+        if response.status_code >= 500:
+            errors += 1
+        count = loadgen.query_count(response.headers.get('Server-Timing'))
+        if count is not None:
+            queries.append(count)
+    report = loadgen.summarize(latencies, errors, time.perf_counter() - start, queries)
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def run(args):
+    # read by app.py when dataset imports it
+    os.environ['METRICS_ENABLED'] = '1'
+    if not args.cache:
+        os.environ['CACHE_TTL'] = '0'
+    import dataset
+    import loadgen
+    from dataset import app, db
+
+    args.per_type = args.items // 3
+    selected = scenarios(args)
+    if args.only:
+        names = args.only.split(',')
+        unknown = set(names) - set(selected)
+        if unknown:
+            sys.exit("Unknown scenarios: " + ', '.join(sorted(unknown)))
+        selected = {name: selected[name] for name in names}
+
+    def seed():
+        dataset.seed(characters=args.per_type, planets=args.per_type, vehicles=args.per_type,
+                     users=args.users, favorites=args.favorites)
+
+    with app.app_context():
+        backend = db.engine.dialect.name
+    results = {}
+    if args.mode in ('both', 'test_client'):
+        seed()
+        results['test_client'] = {}
+        for name, (requests, read_only) in selected.items():
+            run_test_client(app, requests, min(0.5, args.duration))
+            results['test_client'][name] = run_test_client(app, requests, args.duration)
+            print('test_client', name, json.dumps(results['test_client'][name]), file=sys.stderr)
+
+    if args.mode in ('both', 'gunicorn'):
+        seed()
+        env = {'DATABASE_URL': os.environ['DATABASE_URL'], 'METRICS_ENABLED': '1'}
+        if not args.cache:
+            env['CACHE_TTL'] = '0'
+        results['gunicorn'] = {}
+        for name, (requests, read_only) in selected.items():
+            # a fresh server per scenario so the peak RSS belongs to it, writes on SQLite take one client
+            concurrency = args.concurrency if read_only or backend != 'sqlite' else 1
+            with loadgen.gunicorn(workers=args.workers, env=env) as (url, port, pid):
+                loadgen.run_load(port, requests, concurrency=concurrency, duration=min(0.5, args.duration))
+                report = loadgen.run_load(port, requests, concurrency=concurrency, duration=args.duration)
+                report['concurrency'] = concurrency
+                report['peak_rss_mb'] = loadgen.peak_rss_mb(pid)
+            results['gunicorn'][name] = report
+            print('gunicorn', name, json.dumps(report), file=sys.stderr)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=loadgen.ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    output = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'commit': commit,
+            'backend': backend,
+            'python': platform.python_version(),
+            'items': args.items, 'users': args.users, 'favorites': args.favorites,
+            'duration': args.duration, 'concurrency': args.concurrency, 'workers': args.workers,
+            'cache': args.cache,
+        },
+        'results': results,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text + '\n')
+    print(text)
+
+
+# (metric, worse when higher) checked by compare, queries_per_request is flagged on any increase
+CHECKS = [('requests_per_second', False), ('p50_ms', True), ('p95_ms', True), ('p99_ms', True),
+          ('peak_rss_mb', True)]
+
+
+def compare(args):
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+
+    regressions = []
+    for mode, scenarios_results in current['results'].items():
+        for name, result in scenarios_results.items():
+            before = baseline['results'].get(mode, {}).get(name)
+            if before is None:
+                continue
+            for metric, higher_is_worse in CHECKS:
+                old, new = before.get(metric), result.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                if (change > args.threshold) if higher_is_worse else (change < -args.threshold):
+                    regressions.append((mode, name, metric, old, new, change))
+            old, new = before.get('queries_per_request'), result.get('queries_per_request')
+            if old is not None and new is not None and new > old + 0.01:
+                regressions.append((mode, name, 'queries_per_request', old, new, (new - old) / old if old else None))
+            if result.get('errors', 0) > before.get('errors', 0):
+                regressions.append((mode, name, 'errors', before.get('errors', 0), result['errors'], None))
+
+    for mode, name, metric, old, new, change in regressions:
+        relative = ' (%+.0f%%)' % (change * 100) if change is not None else ''
+        print('REGRESSION %s %s %s: %.2f -> %.2f%s' % (mode, name, metric, old, new, relative))
+    if not regressions:
+        print('No regressions above %.0f%%' % (args.threshold * 100))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed the catalog and run the scenarios')
+    run_parser.add_argument('--items', type=int, default=3000, help='characters + planets + vehicles')
+    run_parser.add_argument('--users', type=int, default=300)
+    run_parser.add_argument('--favorites', type=int, default=10, help='favorites per user')
+    run_parser.add_argument('--deletions', type=int, default=500, help='vehicles kept for item_delete')
+    run_parser.add_argument('--mode', choices=['both', 'test_client', 'gunicorn'], default='both')
+    run_parser.add_argument('--only', help='comma separated scenario names')
+    run_parser.add_argument('--duration', type=float, default=3.0, help='seconds per scenario')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--workers', type=int, default=2)
+    run_parser.add_argument('--cache', action='store_true', help='keep the response cache on')
+    run_parser.add_argument('--output', help='JSON file for the results')
+
+    compare_parser = commands.add_parser('compare', help='flag the regressions of current against baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='relative change flagged')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
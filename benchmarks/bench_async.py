@@ -0,0 +1,39 @@
+"""
+Requests per second and latency percentiles of the catalog read endpoints served by gunicorn sync workers
+(wsgi.py) and by uvicorn with the async engine (asgi.py), at high concurrency.
+
+    python benchmarks/bench_async.py --workers 2 --concurrency 64
+"""
+import argparse
+import json
+import os
+
+import dataset
+import loadgen
+
+PATHS = ['/items?limit=50', '/people?limit=50', '/planets?limit=50&sort=-favorite_count', '/vehicles?limit=50',
+         '/people/character-0000001', '/planets/planet-0000002', '/vehicles/vehicle-0000003']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    dataset.seed(characters=args.rows, planets=args.rows, vehicles=args.rows, users=0)
+    env = {'DATABASE_URL': os.environ['DATABASE_URL'], 'CACHE_TTL': '0'}
+    report = {}
+    for name, start in [('wsgi', loadgen.gunicorn), ('asgi', loadgen.uvicorn)]:
+        with start(workers=args.workers, env=env) as (url, port, pid):
+            loadgen.run_load(port, PATHS, concurrency=4, duration=1.0)
+            report[name] = {concurrency: loadgen.run_load(port, PATHS, concurrency=concurrency,
+                                                          duration=args.duration)
+                            for concurrency in args.concurrency}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Throughput of POST /items (one item per request and per transaction) against POST /items/bulk.
+
+    python benchmarks/bench_bulk_insert.py --items 5000
+"""
+import argparse
+import json
+import time
+
+import dataset
+from dataset import app
+
+
+def items(count):
+    rows = []
+    for i in range(count):
+        make_row = [dataset.character_row, dataset.planet_row, dataset.vehicle_row][i % 3]
+        row = make_row(i)
+        del row['id']
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=5000)
+    args = parser.parse_args()
+    rows = items(args.items)
+    client = app.test_client()
+    report = {}
+
+    dataset.seed(characters=0, planets=0, vehicles=0, users=0)
+    start = time.perf_counter()
+    for row in rows:
+        assert client.post('/items', json=row).status_code == 201
+    elapsed = time.perf_counter() - start
+    report['single'] = {'seconds': elapsed, 'items_per_second': args.items / elapsed}
+
+    dataset.seed(characters=0, planets=0, vehicles=0, users=0)
+    start = time.perf_counter()
+    assert client.post('/items/bulk', json=rows).json['created'] == args.items
+    elapsed = time.perf_counter() - start
+    report['bulk_json'] = {'seconds': elapsed, 'items_per_second': args.items / elapsed}
+
+    dataset.seed(characters=0, planets=0, vehicles=0, users=0)
+    body = '\n'.join(json.dumps(row) for row in rows)
+    start = time.perf_counter()
+    assert client.post('/items/bulk', data=body, content_type='application/x-ndjson').json['created'] == args.items
+    elapsed = time.perf_counter() - start
+    report['bulk_ndjson'] = {'seconds': elapsed, 'items_per_second': args.items / elapsed}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
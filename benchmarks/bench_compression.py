@@ -0,0 +1,59 @@
+"""
+Bytes on the wire and CPU per request of GET /items for every available Content-Encoding (see src/compress.py),
+at several catalog sizes. "compressed" runs with the response cache off so every request compresses the body,
+"cached" with the cache on where the compressed variant is kept after the first request.
+
+    python benchmarks/bench_compression.py --sizes 100 1000 10000 --requests 50
+"""
+import argparse
+import json
+import time
+
+import dataset
+from dataset import app
+import app as app_module
+
+
+def measure(client, headers, requests):
+    client.get('/items', headers=headers)
+    size = None
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/items', headers=headers)
+        size = len(response.get_data())
+    return {
+        'bytes': size,
+        'cpu_ms_per_request': (time.process_time() - cpu_start) * 1000 / requests,
+        'ms_per_request': (time.perf_counter() - wall_start) * 1000 / requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='rows per item type')
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    compressor = app_module.compressor
+    cache = app_module.cache
+    ttl = cache.ttl or 60
+    encodings = [None] + compressor.encodings
+    client = app.test_client()
+
+    report = {'encodings': compressor.encodings, 'min_size': compressor.min_size}
+    for size in args.sizes:
+        dataset.seed(characters=size, planets=size, vehicles=size, users=0)
+        results = {}
+        for encoding in encodings:
+            headers = {'Accept-Encoding': encoding} if encoding else {}
+            name = encoding or 'identity'
+            cache.clear()
+            cache.ttl = 0
+            results[name] = {'compressed': measure(client, headers, args.requests)}
+            cache.ttl = ttl
+            results[name]['cached'] = measure(client, headers, args.requests)
+        report[size * 3] = results
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares the ORM serialize() methods with the column serializers used by the list endpoints.
+
+    python benchmarks/bench_serializers.py --rows 20000
+"""
+import argparse
+import json
+import time
+
+import dataset
+from dataset import app, db
+from sqlalchemy.orm import selectin_polymorphic
+from models import Item, Character, Planet, Vehicle, User
+from serializers import column_serializer, OrjsonProvider, orjson
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def orm(model):
+    query = model.query.order_by(model.id)
+    if model is Item:
+        # same loading as GET /items?load=selectin, without it every row lazy loads its subtype
+        query = query.options(selectin_polymorphic(Item, [Character, Planet, Vehicle]))
+    return lambda: [row.serialize() for row in query]
+
+
+def columns(model):
+    serializer = column_serializer(model)
+    return lambda: [serializer(row) for row in serializer.query().order_by(model.id)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000, help='rows per item type')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dataset.seed(characters=args.rows, planets=args.rows, vehicles=args.rows, users=args.rows, favorites=0)
+    report = {}
+    with app.app_context():
+        for model in [Item, Character, User]:
+            # User.serialize() walks the favorites, the list endpoint leaves them out
+            orm_run = (lambda: [user.serialize(include_favorites=False) for user in User.query.order_by(User.id)]) \
+                if model is User else orm(model)
+            report[model.__name__] = {
+                'orm_serialize': best_of(args.repeat, orm_run),
+                'column_serializer': best_of(args.repeat, columns(model)),
+            }
+
+        rows = columns(Item)()
+        report['json'] = {'default': best_of(args.repeat, lambda: app.json.dumps(rows))}
+        if orjson is not None:
+            provider = OrjsonProvider(app)
+            report['json']['orjson'] = best_of(args.repeat, lambda: provider.dumps(rows))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
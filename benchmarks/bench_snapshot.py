@@ -0,0 +1,59 @@
+"""
+Snapshot export and import of a generated catalog (see src/snapshot.py), the import runs on an empty database.
+
+    python benchmarks/bench_snapshot.py --items 1000000
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import dataset
+from dataset import app
+from models import db
+from snapshot import TABLES, export_snapshot, import_snapshot
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=300000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--favorites', type=int, default=20, help='favorites per user')
+    args = parser.parse_args()
+    per_type = args.items // 3
+    dataset.seed(characters=per_type, planets=per_type, vehicles=args.items - 2 * per_type,
+                 users=args.users, favorites=args.favorites)
+    path = tempfile.mkdtemp(prefix='starwars_snapshot_')
+
+    with app.app_context():
+        report = {'backend': db.engine.dialect.name}
+        start = time.perf_counter()
+        manifest = export_snapshot(path)
+        elapsed = time.perf_counter() - start
+        rows = sum(entry['rows'] for entry in manifest['tables'])
+        report['rows'] = rows
+        report['export'] = {'seconds': elapsed, 'rows_per_second': rows / elapsed,
+                            'megabytes': directory_size(path) / 2 ** 20}
+
+        # the users stay, favorites need them
+        for table in reversed(TABLES):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+        start = time.perf_counter()
+        import_snapshot(path)
+        elapsed = time.perf_counter() - start
+        report['import'] = {'seconds': elapsed, 'rows_per_second': rows / elapsed}
+
+    shutil.rmtree(path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
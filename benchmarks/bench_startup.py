@@ -0,0 +1,88 @@
+"""
+Cold start of the API: time to import the app and latency of the first request, for the full app (admin,
+migrate and swagger, like flask run) and the lean one served by wsgi.py, each in a fresh interpreter. Then the
+time from starting gunicorn to the first answered request, with and without GUNICORN_PRELOAD.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import dataset
+import loadgen
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+client = getattr(module, sys.argv[2]).test_client()
+status = client.get('/items?limit=1').status_code
+done = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_request_ms': (done - imported) * 1000,
+                  'status': status}))
+"""
+
+VARIANTS = {
+    'full': ('app', 'app', {'ENABLE_ADMIN': '1', 'ENABLE_MIGRATE': '1', 'ENABLE_SWAGGER': '1'}),
+    'lean': ('wsgi', 'application', {}),
+}
+
+
+def probe(module, attribute, env):
+    output = subprocess.run([sys.executable, '-c', PROBE, module, attribute], cwd=dataset.SRC, check=True,
+                            capture_output=True, text=True, env=dict(os.environ, **env)).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def gunicorn_boot(workers, preload):
+    start = time.perf_counter()
+    env = {'DATABASE_URL': os.environ['DATABASE_URL'], 'GUNICORN_PRELOAD': '1' if preload else '0'}
+    # the repo root has gunicorn.conf.py
+    with loadgen.gunicorn(workers=workers, env=env, args=['--config', os.path.join(loadgen.ROOT, 'gunicorn.conf.py')]) \
+            as (url, port, pid):
+        while True:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            try:
+                connection.request('GET', '/items?limit=1')
+                if connection.getresponse().status == 200:
+                    return (time.perf_counter() - start) * 1000
+            except (OSError, http.client.HTTPException):
+                time.sleep(0.01)
+            finally:
+                connection.close()
+
+
+def median(values):
+    return statistics.median(values) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    dataset.seed(characters=100, planets=100, vehicles=100, users=10)
+
+    report = {}
+    for name, (module, attribute, env) in VARIANTS.items():
+        runs = [probe(module, attribute, env) for _ in range(args.repeat)]
+        assert all(run['status'] == 200 for run in runs)
+        report[name] = {'import_ms': median([run['import_ms'] for run in runs]),
+                        'first_request_ms': median([run['first_request_ms'] for run in runs])}
+    for preload in (False, True):
+        report['gunicorn_preload' if preload else 'gunicorn'] = {
+            'workers': args.workers,
+            'first_response_ms': median([gunicorn_boot(args.workers, preload) for _ in range(args.repeat)]),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
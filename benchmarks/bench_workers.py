@@ -0,0 +1,38 @@
+"""
+Throughput of the read endpoints under gunicorn for several worker counts, with the pool settings taken
+from the environment (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOLER, ... see src/database.py).
+
+    BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_workers.py --workers 1 2 4 8 --concurrency 32 --yes-drop
+"""
+import argparse
+import json
+import os
+
+import dataset
+import loadgen
+
+PATHS = ['/items?limit=50', '/people?limit=50', '/planets?limit=50&sort=-favorite_count', '/vehicles?limit=50',
+         '/users?limit=50&include=favorites']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    dataset.seed(characters=args.rows, planets=args.rows, vehicles=args.rows, users=args.rows // 10)
+    # measure the database path, not the response cache
+    env = {'DATABASE_URL': os.environ['DATABASE_URL'], 'CACHE_TTL': '0'}
+    report = {}
+    for workers in args.workers:
+        with loadgen.gunicorn(workers=workers, env=env) as (url, port, pid):
+            loadgen.run_load(port, PATHS, concurrency=args.concurrency, duration=1.0)
+            report[workers] = loadgen.run_load(port, PATHS, concurrency=args.concurrency, duration=args.duration)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
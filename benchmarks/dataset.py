@@ -0,0 +1,93 @@
+"""
+Synthetic Star Wars catalog used by the benchmarks. The database is chosen with BENCH_DATABASE_URL (a throw away
+sqlite file by default), never with the DATABASE_URL of the app that pipenv loads from .env, so import this module
+before anything that imports app. seed() drops every table: on a database other than SQLite the benchmarks refuse
+to run unless --yes-drop is given.
+"""
+import os
+import random
+import sys
+import tempfile
+from sqlalchemy.engine import make_url
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+BENCH_DATABASE_URL = os.getenv('BENCH_DATABASE_URL',
+                               'sqlite:///' + os.path.join(tempfile.gettempdir(), 'starwars_bench.db'))
+# read by the app and by the servers the benchmarks start
+os.environ['DATABASE_URL'] = BENCH_DATABASE_URL
+# taken out of the command line here so every benchmark accepts it
+YES_DROP = '--yes-drop' in sys.argv
+if YES_DROP:
+    sys.argv.remove('--yes-drop')
+
+from app import app  # noqa: E402
+from models import db, User, Item, Character, Planet, Vehicle, Favorite  # noqa: E402
+
+CHUNK_SIZE = 5000
+
+
+def character_row(i):
+    return {'id': 'character-%07d' % i, 'type': 'character', 'name': 'Character %d' % i,
+            'birth_year': '%dBBY' % (i % 100), 'gender': random.choice(['male', 'female', 'n/a']),
+            'hair_color': random.choice(['blond', 'brown', 'black', 'none']),
+            'eye_color': random.choice(['blue', 'brown', 'yellow', 'red'])}
+
+
+def planet_row(i):
+    return {'id': 'planet-%07d' % i, 'type': 'planet', 'name': 'Planet %d' % i,
+            'population': random.randint(0, 10 ** 9),
+            'climate': random.choice(['arid', 'temperate', 'frozen', 'murky']),
+            'terrain': random.choice(['desert', 'grasslands', 'tundra', 'swamp']),
+            'orbital_period': random.randint(100, 1000), 'rotation_period': random.randint(10, 40)}
+
+
+def vehicle_row(i):
+    return {'id': 'vehicle-%07d' % i, 'type': 'vehicle', 'name': 'Vehicle %d' % i,
+            'passengers': random.randint(0, 500), 'cost_in_credits': random.randint(1000, 10 ** 7),
+            'max_atmosphering_speed': random.randint(100, 2000), 'crew': random.randint(1, 50)}
+
+
+def insert_rows(model, rows):
+    # item rows first, then the subtype table with the remaining columns
+    item_columns = ('id', 'type', 'name')
+    db.session.execute(Item.__table__.insert(),
+                       [dict({key: row[key] for key in item_columns}, is_favorite=False) for row in rows])
+    db.session.execute(model.__table__.insert(),
+                       [{key: value for key, value in row.items() if key not in ('type', 'name')} for row in rows])
+
+
+def seed(characters=1000, planets=1000, vehicles=1000, users=100, favorites=10, seed_value=42):
+    random.seed(seed_value)
+    url = make_url(BENCH_DATABASE_URL)
+    if url.get_backend_name() != 'sqlite' and not YES_DROP:
+        sys.exit("seed() drops every table of %s, run again with --yes-drop if that is intended"
+                 % url.render_as_string(hide_password=True))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        item_ids = []
+        for model, count, make_row in [(Character, characters, character_row),
+                                       (Planet, planets, planet_row),
+                                       (Vehicle, vehicles, vehicle_row)]:
+            for start in range(0, count, CHUNK_SIZE):
+                rows = [make_row(i) for i in range(start, min(start + CHUNK_SIZE, count))]
+                insert_rows(model, rows)
+                item_ids.extend(row['id'] for row in rows)
+            db.session.commit()
+
+        if users:
+            db.session.execute(User.__table__.insert(), [
+                {'id': i, 'email': 'user%d@starwars.com' % i, 'password': 'secret', 'sub_date': '2025-01-01',
+                 'first_name': 'User', 'last_name': str(i)} for i in range(1, users + 1)])
+        favorite_rows = []
+        for user_id in range(1, users + 1):
+            for item_id in random.sample(item_ids, min(favorites, len(item_ids))):
+                favorite_rows.append({'user_id': user_id, 'item_id': item_id})
+        if favorite_rows:
+            db.session.execute(Favorite.__table__.insert(), favorite_rows)
+            # the rows above skip the API, set the favorite_count of their items
+            Item.reconcile_favorite_counts()
+        db.session.commit()
+    return item_ids
@@ -0,0 +1,157 @@
+"""
+Helpers to run the app under gunicorn and drive it over HTTP with a fixed number of concurrent clients.
+"""
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def server(command, port, env=None):
+    process = subprocess.Popen(command, env=dict(os.environ, **(env or {})))
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    break
+            except OSError:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("server did not start: " + ' '.join(command))
+                time.sleep(0.1)
+        yield 'http://127.0.0.1:%d' % port, port, process.pid
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def gunicorn(workers=2, env=None, args=()):
+    # same command as the Procfile
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'wsgi', '--chdir', os.path.join(ROOT, 'src'),
+               '--bind', '127.0.0.1:%d' % port, '--workers', str(workers), '--log-level', 'warning'] + list(args)
+    return server(command, port, env)
+
+
+# the async entry point of src/asgi.py
+def uvicorn(workers=2, env=None, args=()):
+    port = free_port()
+    command = [sys.executable, '-m', 'uvicorn', 'asgi:application', '--app-dir', os.path.join(ROOT, 'src'),
+               '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+               '--log-level', 'warning', '--no-access-log'] + list(args)
+    return server(command, port, env)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(latencies, errors, elapsed, queries=None):
+    report = {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': (percentile(latencies, 0.50) or 0) * 1000,
+        'p95_ms': (percentile(latencies, 0.95) or 0) * 1000,
+        'p99_ms': (percentile(latencies, 0.99) or 0) * 1000,
+    }
+    if queries:
+        report['queries_per_request'] = sum(queries) / len(queries)
+    return report
+
+
+# A request is a path to GET or a (method, path, json body) tuple
+def request_spec(spec):
+    if isinstance(spec, str):
+        return 'GET', spec, None
+    return spec
+
+
+# Query count of the Server-Timing header sent by the app with METRICS_ENABLED=1
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+
+
+def query_count(server_timing):
+    match = QUERIES_PATTERN.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+# Peak resident memory (VmHWM) of a process and its children in MB, Linux only
+def peak_rss_mb(pid):
+    peaks = []
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open('/proc/%d/status' % current) as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        peaks.append(int(line.split()[1]) / 1024)
+            with open('/proc/%d/task/%d/children' % (current, current)) as children:
+                pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return max(peaks) if peaks else None
+
+
+# Every client keeps one connection open and sends requests back to back during `duration` seconds
+def run_load(port, paths, concurrency=8, duration=5.0):
+    latencies = []
+    queries = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        index = offset
+        local, local_queries, failed = [], [], 0
+        while time.perf_counter() < stop:
+            method, path, body = request_spec(paths[index % len(paths)])
+            index += 1
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+                local.append(time.perf_counter() - start)
+                count = query_count(response.getheader('Server-Timing'))
+                if count is not None:
+                    local_queries.append(count)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        with lock:
+            latencies.extend(local)
+            queries.extend(local_queries)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - start, queries)
@@ -0,0 +1,12 @@
+# Read by gunicorn from the directory it is started in (the root of the repo for the Procfile and render.yaml).
+# GUNICORN_PRELOAD=1 imports the app once in the master before forking the workers: faster worker boots and
+# shared memory for the imported modules. post_fork then gives every worker its own empty connection pools.
+import os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import dispose_engines
+        dispose_engines()
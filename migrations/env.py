@@ -38,6 +38,16 @@ def get_metadata():
     return target_db.metadata
 
 
+# The full text index on the item names lives outside the models (see ITEM_SEARCH_* in models.py): the FTS5
+# table item_search and its shadow tables on SQLite, an expression index on Postgres. Autogenerate must not drop them.
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and name.startswith('item_search'):
+        return False
+    if type_ == 'index' and name == 'ix_item_name_search':
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -52,7 +62,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -84,6 +95,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
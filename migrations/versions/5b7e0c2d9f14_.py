@@ -0,0 +1,64 @@
+"""empty message
+
+Revision ID: 5b7e0c2d9f14
+Revises: a4d2e9c71b35
+Create Date: 2026-10-17 19:02:41.337518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0c2d9f14'
+down_revision = 'a4d2e9c71b35'
+branch_labels = None
+depends_on = None
+
+INSERT_SEARCH_ROW = ("INSERT INTO item_search_key(id) VALUES (new.id); "
+                     "INSERT INTO item_search(rowid, id, name) "
+                     "VALUES ((SELECT key FROM item_search_key WHERE id = new.id), new.id, new.name); ")
+DELETE_SEARCH_ROW = ("DELETE FROM item_search WHERE rowid = (SELECT key FROM item_search_key WHERE id = old.id); "
+                     "DELETE FROM item_search_key WHERE id = old.id; ")
+
+
+def drop_search_index():
+    op.execute("DROP TRIGGER IF EXISTS item_search_update")
+    op.execute("DROP TRIGGER IF EXISTS item_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS item_search_insert")
+    op.execute("DROP TABLE IF EXISTS item_search")
+    op.execute("DROP TABLE IF EXISTS item_search_key")
+
+
+def upgrade():
+    # the FTS5 table of ?search= keeps the item id, its rowid comes from item_search_key instead of the rowid of
+    # item that VACUUM can renumber. The same objects are created by the DDL events in models.py
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    drop_search_index()
+    op.execute("CREATE TABLE IF NOT EXISTS item_search_key (key INTEGER PRIMARY KEY, id VARCHAR(100) NOT NULL UNIQUE)")
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(id UNINDEXED, name)")
+    op.execute("CREATE TRIGGER IF NOT EXISTS item_search_insert AFTER INSERT ON item BEGIN "
+               + INSERT_SEARCH_ROW + "END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS item_search_delete AFTER DELETE ON item BEGIN "
+               + DELETE_SEARCH_ROW + "END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS item_search_update AFTER UPDATE OF id, name ON item BEGIN "
+               + DELETE_SEARCH_ROW + INSERT_SEARCH_ROW + "END")
+    op.execute("INSERT INTO item_search_key(id) SELECT id FROM item")
+    op.execute("INSERT INTO item_search(rowid, id, name) SELECT item_search_key.key, item.id, item.name "
+               "FROM item JOIN item_search_key ON item_search_key.id = item.id")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    drop_search_index()
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(name, content='item', content_rowid='rowid')")
+    op.execute("CREATE TRIGGER IF NOT EXISTS item_search_insert AFTER INSERT ON item BEGIN "
+               "INSERT INTO item_search(rowid, name) VALUES (new.rowid, new.name); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS item_search_delete AFTER DELETE ON item BEGIN "
+               "INSERT INTO item_search(item_search, rowid, name) VALUES ('delete', old.rowid, old.name); END")
+    op.execute("CREATE TRIGGER IF NOT EXISTS item_search_update AFTER UPDATE OF name ON item BEGIN "
+               "INSERT INTO item_search(item_search, rowid, name) VALUES ('delete', old.rowid, old.name); "
+               "INSERT INTO item_search(rowid, name) VALUES (new.rowid, new.name); END")
+    op.execute("INSERT INTO item_search(item_search) VALUES ('rebuild')")
@@ -0,0 +1,40 @@
+"""empty message
+
+Revision ID: 7c2f9a1d5e3b
+Revises: 4940c418a023
+Create Date: 2026-10-17 10:12:41.532901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2f9a1d5e3b'
+down_revision = '4940c418a023'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp()))
+
+    catalog_version = op.create_table('catalog_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    for name in ['item', 'character', 'planet', 'vehicle']:
+        op.execute(catalog_version.insert().from_select(
+            ['name', 'version', 'updated_at'],
+            sa.select(sa.literal(name), sa.literal(1), sa.func.current_timestamp())))
+
+def downgrade():
+    op.drop_table('catalog_version')
+
+    with op.batch_alter_table('item', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
@@ -0,0 +1,44 @@
+"""empty message
+
+Revision ID: e5a03b7f1c68
+Revises: b81e4d0c9a27
+Create Date: 2026-10-17 11:48:05.604217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a03b7f1c68'
+down_revision = 'b81e4d0c9a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # full text index for ?search=, the same objects are created by the DDL events in models.py
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(name, content='item', content_rowid='rowid')")
+        op.execute("CREATE TRIGGER IF NOT EXISTS item_search_insert AFTER INSERT ON item BEGIN "
+                   "INSERT INTO item_search(rowid, name) VALUES (new.rowid, new.name); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS item_search_delete AFTER DELETE ON item BEGIN "
+                   "INSERT INTO item_search(item_search, rowid, name) VALUES ('delete', old.rowid, old.name); END")
+        op.execute("CREATE TRIGGER IF NOT EXISTS item_search_update AFTER UPDATE OF name ON item BEGIN "
+                   "INSERT INTO item_search(item_search, rowid, name) VALUES ('delete', old.rowid, old.name); "
+                   "INSERT INTO item_search(rowid, name) VALUES (new.rowid, new.name); END")
+        op.execute("INSERT INTO item_search(item_search) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX IF NOT EXISTS ix_item_name_search ON item USING gin (to_tsvector('simple', name))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS item_search_update")
+        op.execute("DROP TRIGGER IF EXISTS item_search_delete")
+        op.execute("DROP TRIGGER IF EXISTS item_search_insert")
+        op.execute("DROP TABLE IF EXISTS item_search")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_item_name_search")
@@ -1,16 +1,296 @@
+"""
+Admin views of every table (/admin) that stay usable on large tables:
+
+- lists load only their columns, relationships are never lazy loaded per row
+- rows are counted up to ADMIN_EXACT_COUNT (10000 by default), past that an unfiltered list shows the estimate of
+  the backend statistics and a filtered one only the previous/next pager
+- search and filters only use indexed lookups (full text index on the item names, see filters.py)
+- deleting selected rows runs one set-based statement per table and keeps the change log, the favorite counters
+  and the catalog versions up to date like the API does
+"""
 import os
+from flask import flash
 from flask_admin import Admin
-from models import db, User
-from flask_admin.contrib.sqla import ModelView
+from flask_admin.actions import action
+from flask_admin.babel import gettext, lazy_gettext, ngettext
+from flask_admin.contrib.sqla import ModelView, tools
+from flask_admin.contrib.sqla.ajax import QueryAjaxModelLoader
+from flask_admin.model.ajax import DEFAULT_PAGE_SIZE
+from flask_admin.contrib.sqla.filters import FilterEqual, IntEqualFilter, IntGreaterFilter, IntSmallerFilter
+from sqlalchemy import text
+from sqlalchemy.orm import load_only, raiseload
+from models import db, User, Item, Character, Planet, Vehicle, Favorite, CatalogVersion, ChangeLog
+from filters import apply_search
+
+EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT', 10000))
+
+
+# A user id, or the start of an email read as a range of the unique index
+def search_users(query, term):
+    if term.isdigit():
+        return query.filter(User.id == int(term))
+    return query.filter(User.email >= term, User.email < term + '\uffff')
+
+
+def search_items(query, term):
+    return apply_search(query, Item, term)
+
+
+# Picker of the forms (form_ajax_refs) looking up with the indexed search of the lists instead of ILIKE '%term%'
+class IndexedAjaxLoader(QueryAjaxModelLoader):
+    def __init__(self, name, model, search, **options):
+        super().__init__(name, db.session, model, **options)
+        self.search = search
+
+    def get_list(self, term, offset=0, limit=DEFAULT_PAGE_SIZE):
+        query = self.search(self.get_query(), term.strip())
+        query = query.order_by(self.order_by if self.order_by is not None else getattr(self.model, self.pk))
+        return query.offset(offset).limit(limit).all()
+
+
+class AdminView(ModelView):
+    page_size = 50
+    can_set_page_size = True
+    column_display_pk = True
+    column_auto_select_related = False
+    # the count comes from get_list
+    simple_list_pager = True
+
+    # invalidate receives {item id: item type} after every commit that changed the catalog
+    def __init__(self, model, session, invalidate=None, **kwargs):
+        self.invalidate = invalidate or (lambda item_types: None)
+        super().__init__(model, session, **kwargs)
+
+    def get_query(self):
+        columns = [getattr(self.model, name) for name in self.column_list]
+        return super().get_query().options(load_only(*columns), raiseload('*'))
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        count, query = super().get_list(page, sort_column, sort_desc, search, filters, False, page_size)
+        count = self.bounded_count(query)
+        if count is None and not search and not filters:
+            count = self.estimated_count()
+        return count, query.all() if execute else query
+
+    # Exact count when there are at most EXACT_COUNT_LIMIT rows, None otherwise
+    def bounded_count(self, query):
+        rows = (query.limit(None).offset(None).order_by(None).statement
+                .with_only_columns(db.literal_column('1'), maintain_column_froms=True)
+                .limit(EXACT_COUNT_LIMIT + 1).subquery())
+        count = self.session.execute(db.select(db.func.count()).select_from(rows)).scalar()
+        return count if count <= EXACT_COUNT_LIMIT else None
+
+    # Row count of the table from the statistics of the backend, max(rowid) on SQLite
+    def estimated_count(self):
+        dialect = self.session.get_bind().dialect
+        name = self.model.__table__.name
+        if dialect.name == 'postgresql':
+            estimate = self.session.execute(text("SELECT reltuples::bigint FROM pg_class "
+                                                 "WHERE oid = to_regclass(:name)"),
+                                            {'name': dialect.identifier_preparer.quote(name)}).scalar()
+        elif dialect.name == 'mysql':
+            estimate = self.session.execute(text("SELECT table_rows FROM information_schema.tables "
+                                                 "WHERE table_schema = DATABASE() AND table_name = :name"),
+                                            {'name': name}).scalar()
+        elif dialect.name == 'sqlite':
+            estimate = self.session.execute(
+                text("SELECT max(rowid) FROM %s" % dialect.identifier_preparer.quote(name))).scalar()
+        else:
+            return None
+        # reltuples is -1 until the table is analyzed
+        return int(estimate) if estimate is not None and estimate >= 0 else None
+
+    # search(query, term) of the views with a column_searchable_list runs their indexed lookup instead of the
+    # LIKE '%term%' of flask-admin, the views without one keep the default search
+    search = None
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        if self.search is None:
+            return super()._apply_search(query, count_query, joins, count_joins, search)
+        return self.search(query, search.strip()), count_query, joins, count_joins
+
+    # delete_rows(ids) deletes the rows of the selected ids (the primary keys as flask-admin sends them) with
+    # set-based statements and returns the number of rows deleted and {item id: item type} of the items to
+    # invalidate. The views without one keep the deletes of flask-admin.
+    delete_rows = None
+
+    def delete_ids(self, ids):
+        count, item_types = self.delete_rows(ids)
+        self.session.commit()
+        self.invalidate(item_types)
+        return count
+
+    @action('delete',
+            lazy_gettext('Delete'),
+            lazy_gettext('Are you sure you want to delete selected records?'))
+    def action_delete(self, ids):
+        if self.delete_rows is None:
+            return super().action_delete(ids)
+        try:
+            count = self.delete_ids(ids)
+            flash(ngettext('Record was successfully deleted.',
+                           '%(count)s records were successfully deleted.',
+                           count,
+                           count=count), 'success')
+        except Exception as ex:
+            self.session.rollback()
+            if not self.handle_view_exception(ex):
+                raise
+            flash(gettext('Failed to delete records. %(error)s', error=str(ex)), 'error')
+
+    def delete_model(self, model):
+        if self.delete_rows is None:
+            return super().delete_model(model)
+        try:
+            self.on_model_delete(model)
+            pk = self.get_pk_value(model)
+            self.delete_ids([tools.iterencode(pk) if isinstance(pk, tuple) else pk])
+        except Exception as ex:
+            self.session.rollback()
+            if not self.handle_view_exception(ex):
+                flash(gettext('Failed to delete record. %(error)s', error=str(ex)), 'error')
+            return False
+        self.after_model_delete(model)
+        return True
+
+
+class UserView(AdminView):
+    column_list = ('id', 'email', 'first_name', 'last_name', 'sub_date')
+    column_sortable_list = ('id', 'email')
+    column_default_sort = 'id'
+    column_searchable_list = ('email',)
+    form_excluded_columns = ('favorites',)
+
+    def search(self, query, term):
+        return search_users(query, term)
+
+    def delete_rows(self, ids):
+        return User.delete_many(int(user_id) for user_id in ids)
 
-def setup_admin(app):
+
+class ItemView(AdminView):
+    # every type, editing is done in the view of each type
+    can_create = False
+    can_edit = False
+    column_list = ('id', 'type', 'name', 'favorite_count', 'updated_at')
+    column_sortable_list = ('id', 'name', 'favorite_count')
+    column_default_sort = 'id'
+    column_searchable_list = ('name',)
+    column_filters = (
+        FilterEqual(Item.type, 'Type', options=[(name, name) for name in ('character', 'planet', 'vehicle')]),
+        IntGreaterFilter(Item.favorite_count, 'Favorites'),
+        IntSmallerFilter(Item.favorite_count, 'Favorites'),
+    )
+
+    def search(self, query, term):
+        return apply_search(query, self.model, term)
+
+    def delete_rows(self, ids):
+        item_types = Item.delete_many(ids)
+        return len(item_types), item_types
+
+    def on_model_change(self, form, model, is_created):
+        model.touch()
+
+    def after_model_change(self, form, model, is_created):
+        self.invalidate({model.id: model.type})
+
+
+class CharacterView(ItemView):
+    can_create = True
+    can_edit = True
+    column_list = ('id', 'name', 'birth_year', 'gender', 'hair_color', 'eye_color', 'favorite_count')
+    form_columns = ('id', 'name', 'birth_year', 'gender', 'hair_color', 'eye_color')
+    column_filters = ItemView.column_filters[1:]
+
+
+class PlanetView(ItemView):
+    can_create = True
+    can_edit = True
+    column_list = ('id', 'name', 'population', 'climate', 'terrain', 'orbital_period', 'rotation_period',
+                   'favorite_count')
+    form_columns = ('id', 'name', 'population', 'climate', 'terrain', 'orbital_period', 'rotation_period')
+    column_filters = ItemView.column_filters[1:]
+
+
+class VehicleView(ItemView):
+    can_create = True
+    can_edit = True
+    column_list = ('id', 'name', 'passengers', 'cost_in_credits', 'max_atmosphering_speed', 'crew',
+                   'favorite_count')
+    form_columns = ('id', 'name', 'passengers', 'cost_in_credits', 'max_atmosphering_speed', 'crew')
+    column_filters = ItemView.column_filters[1:]
+
+
+class FavoriteView(AdminView):
+    can_edit = False
+    column_list = ('item_id', 'user_id')
+    column_sortable_list = ('item_id', 'user_id')
+    column_default_sort = 'item_id'
+    column_searchable_list = ('item_id', 'user_id')
+    column_filters = (
+        IntEqualFilter(Favorite.user_id, 'User id'),
+        FilterEqual(Favorite.item_id, 'Item id'),
+    )
+    # the user and the item are picked by searching, not from a select of every row
+    form_columns = ('user', 'item')
+    form_ajax_refs = {
+        'user': IndexedAjaxLoader('user', User, search_users, fields=('email',), order_by=User.email,
+                                  page_size=10),
+        'item': IndexedAjaxLoader('item', Item, search_items, fields=('name',), page_size=10),
+    }
+
+    # a user id or an item id, both indexed
+    def search(self, query, term):
+        if term.isdigit():
+            return query.filter(Favorite.user_id == int(term))
+        return query.filter(Favorite.item_id == term)
+
+    def delete_rows(self, ids):
+        keys = [tools.iterdecode(favorite_id) for favorite_id in ids]
+        table = Favorite.__table__
+        return Favorite.delete_many(db.tuple_(table.c.item_id, table.c.user_id).in_(
+            [(item_id, int(user_id)) for item_id, user_id in keys]))
+
+    def on_model_change(self, form, model, is_created):
+        ChangeLog.record('favorite', 'upsert', [model.item.id], model.user.id)
+        Item.count_favorites([model.item.id], 1)
+
+    def after_model_change(self, form, model, is_created):
+        self.invalidate({model.item.id: model.item.type})
+
+
+# Written by the API only
+class ReadOnlyView(AdminView):
+    can_create = False
+    can_edit = False
+    can_delete = False
+
+
+class CatalogVersionView(ReadOnlyView):
+    column_list = ('name', 'version', 'updated_at')
+
+
+class ChangeLogView(ReadOnlyView):
+    column_list = ('id', 'entity', 'op', 'item_id', 'user_id', 'created_at')
+    column_sortable_list = ('id',)
+    column_default_sort = ('id', True)
+    column_filters = (
+        IntGreaterFilter(ChangeLog.id, 'Id'),
+        IntSmallerFilter(ChangeLog.id, 'Id'),
+    )
+
+
+def setup_admin(app, invalidate=None):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
 
-    
-    # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-
-    # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    admin.add_view(UserView(User, db.session, invalidate))
+    admin.add_view(ItemView(Item, db.session, invalidate, name='Items'))
+    admin.add_view(CharacterView(Character, db.session, invalidate, category='Catalog'))
+    admin.add_view(PlanetView(Planet, db.session, invalidate, category='Catalog'))
+    admin.add_view(VehicleView(Vehicle, db.session, invalidate, category='Catalog'))
+    admin.add_view(FavoriteView(Favorite, db.session, invalidate))
+    admin.add_view(CatalogVersionView(CatalogVersion, db.session, name='Catalog versions'))
+    admin.add_view(ChangeLogView(ChangeLog, db.session, name='Change log'))
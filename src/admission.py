@@ -0,0 +1,152 @@
+"""
+Admission control (ADMISSION_ENABLED=1): requests are split in classes (cheap reads, list scans, writes), each with
+a limit of requests in flight and a latency target. Instead of piling up behind a slow database the excess requests
+get a 503 with Retry-After right away:
+
+    ADMISSION_LIMIT_READ=64 ADMISSION_LIMIT_LIST=16 ADMISSION_LIMIT_WRITE=8   requests in flight per worker
+    ADMISSION_TARGET_MS_READ=100 ADMISSION_TARGET_MS_LIST=500 ADMISSION_TARGET_MS_WRITE=500
+    ADMISSION_ADAPTIVE=1          AIMD: the limit shrinks by 10% while the class is over its latency target
+                                  and grows back by 1/limit per request under it
+    ADMISSION_QUEUE_TIMEOUT_MS=1000   requests that waited longer than this before reaching the app (X-Request-Start
+                                      of the router or proxy) are dropped, their client has most likely given up
+    ADMISSION_RETRY_AFTER=1
+
+The in flight limits matter with threaded workers (gthread), with sync workers the queue time is what sheds.
+Counters are served on /admission/stats and added to /metrics.
+"""
+import os
+import time
+from threading import Lock
+from flask import g, jsonify, request
+
+DEFAULTS = {'read': (64, 100), 'list': (16, 500), 'write': (8, 500)}
+
+
+def env_number(name, default):
+    return float(os.getenv(name, default))
+
+
+class RouteClass:
+    def __init__(self, name, limit, target_ms, adaptive):
+        self.name = name
+        self.max_limit = limit
+        self.limit = float(limit)
+        self.target_ms = target_ms
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {'concurrency': 0, 'queue_time': 0}
+        # moving average of the latency
+        self.latency_ms = 0.0
+
+    def completed(self, elapsed_ms):
+        self.latency_ms = elapsed_ms if not self.latency_ms else 0.9 * self.latency_ms + 0.1 * elapsed_ms
+        if not self.adaptive:
+            return
+        if self.latency_ms > self.target_ms:
+            self.limit = max(1.0, self.limit * 0.9)
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def stats(self):
+        return {
+            'limit': round(self.limit, 2),
+            'max_limit': self.max_limit,
+            'target_ms': self.target_ms,
+            'in_flight': self.in_flight,
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+            'latency_ms': round(self.latency_ms, 2),
+        }
+
+
+# X-Request-Start as sent by Heroku (t=<ms>), nginx (t=<seconds.millis>) or in microseconds, returns seconds
+def request_start(value):
+    try:
+        start = float(value.replace('t=', '').strip())
+    except (AttributeError, ValueError):
+        return None
+    if start > 1e14:
+        return start / 1e6
+    if start > 1e11:
+        return start / 1e3
+    return start
+
+
+class AdmissionControl:
+    # endpoints maps the view names that are not classified by their method ('list' scans, reads sent with POST)
+    def __init__(self, endpoints=None, exempt=()):
+        adaptive = os.getenv('ADMISSION_ADAPTIVE', '0') == '1'
+        self.classes = {
+            name: RouteClass(name, int(env_number('ADMISSION_LIMIT_' + name.upper(), limit)),
+                             env_number('ADMISSION_TARGET_MS_' + name.upper(), target_ms), adaptive)
+            for name, (limit, target_ms) in DEFAULTS.items()}
+        self.endpoints = endpoints or {}
+        self.exempt = set(exempt)
+        self.queue_timeout = env_number('ADMISSION_QUEUE_TIMEOUT_MS', 1000) / 1000
+        self.retry_after = int(env_number('ADMISSION_RETRY_AFTER', 1))
+        self.lock = Lock()
+
+    def classify(self):
+        if request.endpoint in self.endpoints:
+            return self.endpoints[request.endpoint]
+        return 'read' if request.method in ('GET', 'HEAD', 'OPTIONS') else 'write'
+
+    def overloaded(self, reason):
+        response = jsonify({"error": "Server overloaded, retry later", "reason": reason})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+    def init_app(self, app):
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+        app.add_url_rule('/admission/stats', 'admission_stats', lambda: (jsonify(self.stats()), 200),
+                         methods=['GET'])
+        self.exempt.add('admission_stats')
+
+    def admit(self):
+        if request.endpoint is None or request.endpoint in self.exempt:
+            return None
+        route_class = self.classes[self.classify()]
+        start = request_start(request.headers.get('X-Request-Start'))
+        now = time.time()
+        with self.lock:
+            if start is not None and self.queue_timeout and now - start > self.queue_timeout:
+                route_class.shed['queue_time'] += 1
+                return self.overloaded('queue_time')
+            if route_class.in_flight >= int(route_class.limit):
+                route_class.shed['concurrency'] += 1
+                return self.overloaded('concurrency')
+            route_class.in_flight += 1
+            route_class.admitted += 1
+        g.admission = (route_class, time.perf_counter())
+        return None
+
+    def release(self, exception=None):
+        admission = g.pop('admission', None)
+        if admission is None:
+            return
+        route_class, start = admission
+        with self.lock:
+            route_class.in_flight -= 1
+            route_class.completed((time.perf_counter() - start) * 1000)
+
+    def stats(self):
+        with self.lock:
+            return {name: route_class.stats() for name, route_class in self.classes.items()}
+
+    # Prometheus lines for /metrics
+    def metrics(self):
+        stats = self.stats()
+        lines = ['# TYPE admission_shed_total counter']
+        for name, values in sorted(stats.items()):
+            for reason, count in sorted(values['shed'].items()):
+                lines.append('admission_shed_total{class="%s",reason="%s"} %d' % (name, reason, count))
+        for metric, key, kind in [('admission_admitted_total', 'admitted', 'counter'),
+                                  ('admission_in_flight', 'in_flight', 'gauge'),
+                                  ('admission_limit', 'limit', 'gauge')]:
+            lines.append('# TYPE %s %s' % (metric, kind))
+            for name, values in sorted(stats.items()):
+                lines.append('%s{class="%s"} %s' % (metric, name, values[key]))
+        return lines
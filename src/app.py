@@ -1,14 +1,26 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
+import hashlib
+import json
+import operator
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import uuid
+from datetime import timedelta
+from flask import Flask, Response, request, jsonify, url_for, stream_with_context
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, User, Item, Favorite, Character, Vehicle, Planet
+from sqlalchemy.orm import selectin_polymorphic, with_polymorphic
+from utils import APIException, generate_sitemap, decode_cursor, encode_cursor, parse_fields, parse_limit
+from commands import setup_commands
+from serializers import column_serializer, setup_json
+from cache import ResponseCache
+from compress import Compressor
+from metrics import metrics
+from database import engine_options, pool_metrics
+from replicas import ReplicaRouter
+from admission import AdmissionControl
+from filters import Listing, lookup_results, parse_ids
+from models import db, User, Item, Favorite, Character, Vehicle, Planet, CatalogVersion, ChangeLog, public_columns, utcnow, insert_ignore_duplicates
 #from models import Person
 
 app = Flask(__name__)
@@ -20,11 +32,113 @@ if db_url is not None:
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
-MIGRATE = Migrate(app, db)
 db.init_app(app)
+
+# Load shedding per route class before any other work, see admission.py
+admission = None
+if os.getenv("ADMISSION_ENABLED", "0") == "1":
+    admission = AdmissionControl(
+        endpoints={'get_items': 'list', 'get_people': 'list', 'get_planets': 'list', 'get_vehicles': 'list',
+                   'get_users': 'list', 'get_items_batch': 'list'},
+        exempt=('metrics', 'get_cache_stats', 'sitemap'))
+    admission.init_app(app)
+
+# GET requests read from the replicas when DATABASE_READ_URLS is set
+read_urls = [url.strip().replace("postgres://", "postgresql://")
+             for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+replicas = ReplicaRouter(read_urls) if read_urls else None
+if replicas:
+    replicas.init_app(app, db)
 CORS(app)
-setup_admin(app)
+setup_commands(app)
+setup_json(app)
+
+# Tools the API itself doesn't need, on by default for `flask run` and `flask db`. wsgi.py turns them off so the
+# gunicorn workers don't import them: ENABLE_ADMIN=1 (/admin), ENABLE_MIGRATE=1 (flask db), ENABLE_SWAGGER=1 (/swagger)
+def enabled(name):
+    return os.getenv(name, "1") == "1"
+
+if enabled("ENABLE_MIGRATE"):
+    from flask_migrate import Migrate
+    MIGRATE = Migrate(app, db)
+if enabled("ENABLE_ADMIN"):
+    from admin import setup_admin
+    # the admin writes drop the cached responses of this process like the API writes (invalidate_items is below)
+    setup_admin(app, invalidate=lambda item_types: invalidate_items(item_types))
+if enabled("ENABLE_SWAGGER"):
+    @app.route('/swagger', methods=['GET'])
+    def get_swagger():
+        from flask_swagger import swagger
+        return jsonify(swagger(app)), 200
+
+# With gunicorn preload_app the app is imported once in the master, every worker calls this after the fork
+# (gunicorn.conf.py) so the pooled connections opened in the master are left to it instead of being shared
+def dispose_engines():
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    if replicas:
+        replicas.dispose(close=False)
+
+# Request timing and SQL instrumentation, served on /metrics
+if os.getenv("METRICS_ENABLED", "0") == "1":
+    metrics.init_app(app)
+    metrics.add_collector(lambda: pool_metrics(db.engine))
+    if admission:
+        metrics.add_collector(admission.metrics)
+
+# Negotiated gzip/br/zstd for the larger responses, see compress.py
+compressor = Compressor.from_env()
+if compressor.enabled:
+    compressor.init_app(app)
+
+# Catalog responses are cached per worker with their compressed variants, CACHE_TTL=0 disables the cache.
+# With replicas the entries are kept per database: a client reading from the primary after its own write (see
+# replicas.py) never gets a body, or an ETag, read from a lagging replica.
+cache = ResponseCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 1024)), ttl=int(os.getenv("CACHE_TTL", 60)),
+                      compressor=compressor if compressor.enabled else None,
+                      scope=(lambda: db.session.info.get('replica')) if replicas else None)
+
+# list and detail cache namespaces of each item type
+CACHE_NAMESPACES = {
+    'character': ('people', 'character'),
+    'planet': ('planets', 'planet'),
+    'vehicle': ('vehicles', 'vehicle'),
+}
+
+def invalidate_item(item_id, item_type):
+    list_namespace, detail_namespace = CACHE_NAMESPACES[item_type]
+    cache.invalidate('items')
+    cache.invalidate('popular')
+    cache.invalidate(list_namespace)
+    cache.invalidate(detail_namespace, item_id)
+
+def invalidate_items(item_types):
+    for item_id, item_type in item_types.items():
+        invalidate_item(item_id, item_type)
+
+# ETag of a list: the version of its collection plus everything in the request that changes the body
+def collection_version(name):
+    def resolve():
+        row = db.session.query(CatalogVersion.version, CatalogVersion.updated_at).filter_by(name=name).first()
+        if row is None:
+            return None
+        variant = repr((request.path, sorted(request.args.items(multi=True)), stream_format()))
+        etag = "%s-%d-%s" % (name, row.version, hashlib.sha1(variant.encode('utf-8')).hexdigest()[:16])
+        return etag, row.updated_at
+    return resolve
+
+# ETag of a single item: its id and version, read without loading the subtype row
+def item_version(item_type):
+    def resolve(**kwargs):
+        item_id = next(iter(kwargs.values()))
+        row = db.session.query(Item.version, Item.updated_at).filter_by(id=item_id, type=item_type).first()
+        if row is None:
+            return None
+        return "%s-%d" % (item_id, row.version), row.updated_at
+    return resolve
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -36,29 +150,169 @@ def handle_invalid_usage(error):
 def sitemap():
     return generate_sitemap(app)
 
+# Full lists can be streamed instead of built in memory: ?stream=ndjson (or Accept: application/x-ndjson)
+# sends one object per line, ?stream=json sends a regular JSON array in chunks.
+STREAM_CHUNK_SIZE = 500
+
+def stream_format():
+    stream = request.args.get('stream')
+    if stream in ['json', 'ndjson']:
+        return stream
+    if request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        return 'ndjson'
+    return None
+
+def stream_response(query, serializer, extend, stream, not_found_message):
+    if not db.session.query(query.exists()).scalar():
+        return jsonify({"error": not_found_message}), 404
+
+    def chunks():
+        chunk = []
+        for row in query.yield_per(STREAM_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == STREAM_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def generate():
+        separator = '[' if stream == 'json' else ''
+        for chunk in chunks():
+            results = [serializer(row) for row in chunk]
+            if extend:
+                extend(results, True)
+            for result in results:
+                if stream == 'json':
+                    yield separator + app.json.dumps(result)
+                    separator = ','
+                else:
+                    yield app.json.dumps(result) + '\n'
+        if stream == 'json':
+            yield ']'
+
+    mimetype = 'application/json' if stream == 'json' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+# Lists accept ?limit=&after= for keyset pagination and ?fields= to load only some columns.
+# Filters, ?sort= and ?search= are described in filters.py.
+# Without limit/after the whole table is returned as a plain list like before.
+# By default the rows are read as plain tuples and turned into dicts by a serializer compiled from the model columns,
+# entity/options switch to loading ORM instances and calling serialize() on them.
+def list_response(model, not_found_message, entity=None, options=(), extend=None):
+    listing = Listing(model, request.args)
+    if listing.fields or (entity is None and not options):
+        serializer = column_serializer(model, tuple(listing.fields) if listing.fields else None)
+        query = serializer.query()
+    else:
+        serializer = operator.methodcaller('serialize')
+        query = db.session.query(entity if entity is not None else model).options(*options)
+    query = listing.apply(query)
+
+    stream = stream_format()
+    if stream and not listing.paginated:
+        return stream_response(query, serializer, extend, stream, not_found_message)
+
+    rows = query.all()
+    if not rows:
+        return jsonify({"error": not_found_message}), 404
+    rows, next_cursor = listing.page(rows)
+
+    results = [serializer(row) for row in rows]
+    if extend:
+        extend(results, listing.paginated)
+
+    if listing.paginated:
+        return jsonify({"results": results, "next": next_cursor}), 200
+    return jsonify(results), 200
+
+# Item rows are polymorphic, by default all subtype columns are read in one outer joined column query.
+# ?load=selectin and ?load=joined load ORM instances instead, with the subtype columns loaded for the whole page at once
+# (one extra query per subtype table, or a single outer joined query) so serialize() never lazy loads.
+def polymorphic_loader(load):
+    subtypes = [Character, Vehicle, Planet]
+    if load == 'joined':
+        return {'entity': with_polymorphic(Item, subtypes)}
+    if load == 'selectin':
+        return {'options': [selectin_polymorphic(Item, subtypes)]}
+    return {}
+
+# Multi get: any mix of item types in one polymorphic column query, ?fields= keeps some of the Item columns.
+# GET /items?ids=a,b,c or POST /items/batch with {"ids": [...]} for long lists, answers
+# {"results": [...in the order of the ids], "missing": [ids not found]}
+def items_by_id(ids, fields=None):
+    fields = parse_fields(fields, public_columns(Item))
+    serializer = column_serializer(Item, tuple(fields) if fields else None)
+    rows = serializer.query().filter(Item.id.in_(ids)).all()
+    return jsonify(lookup_results(ids, [serializer(row) for row in rows])), 200
+
+@app.route('/items/batch', methods=['POST'])
+def get_items_batch():
+    data = request.get_json(silent=True) or {}
+    ids = parse_ids(data.get('ids'))
+    try:
+        return items_by_id(ids, request.args.get('fields'))
+    except APIException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/items', methods=['GET'])
+@cache.cached('items', collection_version('item'))
 def get_items():
+    if 'ids' in request.args:
+        ids = parse_ids(request.args['ids'])
+        try:
+            return items_by_id(ids, request.args.get('fields'))
+        except APIException:
+            raise
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    load = request.args.get('load', 'columns')
+    if load not in ['columns', 'selectin', 'joined']:
+        return jsonify({"error": "load must be columns, selectin or joined"}), 400
     try:
-        items = Item.query.all()
-        if items:
-            return jsonify([item.serialize() for item in items]), 200
-        else:
-            return jsonify({"error": "No items found"}), 404
+        return list_response(Item, "No items found", **polymorphic_loader(load))
+    except APIException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Most favorited items, ?type= keeps one item type and ?limit= (10 by default) the size of the list.
+# The order comes from the favorite_count indexes read backwards (ties by id descending, the same direction as
+# the count) so only the returned rows are read.
+POPULAR_MODELS = {'character': Character, 'planet': Planet, 'vehicle': Vehicle}
+
+@app.route('/items/popular', methods=['GET'])
+@cache.cached('popular', collection_version('item'))
+def get_popular_items():
+    item_type = request.args.get('type')
+    if item_type is not None and item_type not in POPULAR_MODELS:
+        return jsonify({"error": "type must be character, planet or vehicle"}), 400
+    limit = parse_limit(request.args.get('limit'), default=10)
+    model = POPULAR_MODELS.get(item_type, Item)
+    try:
+        serializer = column_serializer(model)
+        query = serializer.query()
+        if item_type is not None:
+            query = query.filter(Item.type == item_type)
+        rows = query.order_by(Item.favorite_count.desc(), Item.id.desc()).limit(limit).all()
+        return jsonify([serializer(row) for row in rows]), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/people', methods=['GET'])
+@cache.cached('people', collection_version('character'))
 def get_people():
     try:
-        people = Character.query.all()
-        if people:
-            return jsonify([character.serialize() for character in people]), 200
-        else:
-            return jsonify({"error": "No people found"}), 404
+        return list_response(Character, "No people found")
+    except APIException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/people/<int:character_uid>', methods=['GET'])
+@app.route('/people/<character_uid>', methods=['GET'])
+@cache.cached('character', item_version('character'))
 def get_character(character_uid):
     try:
         character = Character.query.get(character_uid)
@@ -70,17 +324,17 @@ def get_character(character_uid):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/planets', methods=['GET'])
+@cache.cached('planets', collection_version('planet'))
 def get_planets():
     try:
-        planets = Planet.query.all()
-        if planets:
-            return jsonify([planet.serialize() for planet in planets]), 200
-        else:
-            return jsonify({"error": "No planets found"}), 404
+        return list_response(Planet, "No planets found")
+    except APIException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/planets/<int:planet_uid>', methods=['GET'])
+@app.route('/planets/<planet_uid>', methods=['GET'])
+@cache.cached('planet', item_version('planet'))
 def get_planet(planet_uid):
     try:
         planet = Planet.query.get(planet_uid)
@@ -92,17 +346,17 @@ def get_planet(planet_uid):
         return jsonify({"error": str(e)}), 500
 
 @app.route('/vehicles', methods=['GET'])
+@cache.cached('vehicles', collection_version('vehicle'))
 def get_vehicles():
     try:
-        vehicles = Vehicle.query.all()
-        if vehicles:
-            return jsonify([vehicle.serialize() for vehicle in vehicles]), 200
-        else:
-            return jsonify({"error": "No vehicles found"}), 404
+        return list_response(Vehicle, "No vehicles found")
+    except APIException:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/vehicles/<int:vehicle_uid>', methods=['GET'])
+@app.route('/vehicles/<vehicle_uid>', methods=['GET'])
+@cache.cached('vehicle', item_version('vehicle'))
 def get_vehicle(vehicle_uid):
     try:
         vehicle = Vehicle.query.get(vehicle_uid)
@@ -113,18 +367,72 @@ def get_vehicle(vehicle_uid):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Favorites for a list of users come from a single query grouped in python instead of one lazy load per user.
+# A paginated list only asks for the users of the page, a full list reads the whole favorite table once.
+def add_user_favorites(results, paginated):
+    query = db.session.query(Favorite.user_id, Favorite.item_id)
+    if paginated:
+        query = query.filter(Favorite.user_id.in_([user['id'] for user in results]))
+    favorites = {}
+    for user_id, item_id in query:
+        favorites.setdefault(user_id, []).append(item_id)
+    for user in results:
+        user['favorites'] = favorites.get(user['id'], [])
+
+#Favorites are only returned with ?include=favorites
 @app.route('/users', methods=['GET'])
 def get_users():
+    include = request.args.get('include', '').split(',')
+    extend = add_user_favorites if 'favorites' in include else None
+    try:
+        return list_response(User, "No users found", extend=extend)
+    except APIException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Favorites of a user read from the (user_id, item_id) index of favorite in a single query, without loading the user.
+# ?expand=items returns {id, type, name, favorite_count} summaries joined in the same query instead of the item ids,
+# ?limit=&after= paginate on the item id like the other lists. The user is only looked up when there are no favorites.
+FAVORITE_SUMMARY_FIELDS = ('id', 'type', 'name', 'favorite_count')
+
+def favorite_summary(row):
+    return dict(zip(FAVORITE_SUMMARY_FIELDS, row))
+
+@app.route('/users/<int:user_id>/favorites', methods=['GET'])
+def get_user_favorites(user_id):
+    expand = request.args.get('expand', '').split(',')
+    paginated = 'limit' in request.args or 'after' in request.args
+    limit = parse_limit(request.args.get('limit')) if paginated else None
+    after = request.args.get('after')
+    cursor = decode_cursor(after) if after else None
+    if cursor is not None and not isinstance(cursor, str):
+        raise APIException("Invalid cursor", status_code=400)
     try:
-        users = User.query.all()
-        if users:
-            return jsonify([user.serialize() for user in users]), 200
+        if 'items' in expand:
+            query = db.session.query(Favorite.item_id, Item.type, Item.name, Item.favorite_count) \
+                .join(Item, Item.id == Favorite.item_id)
+            serializer = favorite_summary
         else:
-            return jsonify({"error": "No users found"}), 404
+            query = db.session.query(Favorite.item_id)
+            serializer = operator.itemgetter(0)
+        query = query.filter(Favorite.user_id == user_id).order_by(Favorite.item_id)
+        if cursor is not None:
+            query = query.filter(Favorite.item_id > cursor)
+        if paginated:
+            query = query.limit(limit + 1)
+        rows = query.all()
+
+        if not rows and not db.session.query(User.id).filter_by(id=user_id).first():
+            return jsonify({"error": "User not found"}), 404
+        if not paginated:
+            return jsonify([serializer(row) for row in rows]), 200
+        next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        return jsonify({"results": [serializer(row) for row in rows[:limit]], "next": next_cursor}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-#No autentication at this point so you need to send user_id of the user you want to see favorite list in the request body
+#Deprecated, use GET /users/<user_id>/favorites. Kept for the clients sending user_id in the request body
 @app.route('/users/favorites', methods=['GET'])
 def get_favorites():
     data = request.get_json()
@@ -132,10 +440,11 @@ def get_favorites():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     try:
-        user = User.query.get(user_id)
+        user = db.session.query(User.first_name).filter_by(id=user_id).first()
         if user:
-            favorites = user.favorites
-            return jsonify([user.first_name, [favorite.item_id for favorite in favorites]]), 200
+            item_ids = [item_id for item_id, in db.session.query(Favorite.item_id)
+                        .filter_by(user_id=user_id).order_by(Favorite.item_id)]
+            return jsonify([user.first_name, item_ids]), 200
         else:
             return jsonify({"error": "User not found"}), 404
     except Exception as e:
@@ -162,7 +471,10 @@ def add_favorite_item():
         
         favorite = Favorite(user_id=user.id, item_id=item.id)
         db.session.add(favorite)
+        ChangeLog.record('favorite', 'upsert', [item.id], user.id)
+        item_types = Item.count_favorites([item.id], 1)
         db.session.commit()
+        invalidate_items(item_types)
         return jsonify({"message": "Favorite item added successfully"}), 201
 
     except Exception as e:
@@ -184,7 +496,10 @@ def remove_favorite_item():
             favorite = Favorite.query.filter_by(user_id=user.id, item_id=item.id).first()
             if favorite:
                 db.session.delete(favorite)
+                ChangeLog.record('favorite', 'delete', [item.id], user.id)
+                item_types = Item.count_favorites([item.id], -1)
                 db.session.commit()
+                invalidate_items(item_types)
                 return jsonify({"message": "Favorite item removed successfully"}), 200
             else:
                 return jsonify({"error": "Favorite not found"}), 404
@@ -194,21 +509,87 @@ def remove_favorite_item():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-#Endpoint to create a new item
-@app.route('/items', methods=['POST'])
-def create_item():
-    data = request.get_json()
+# Set based favorites sync: PUT replaces the whole set with {"item_ids": [...]}, PATCH takes {"add": [...], "remove": [...]}.
+# Whatever the number of items it runs a fixed number of queries in one transaction.
+def item_id_list(data, key):
+    values = data.get(key, [])
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise APIException(key + " must be a list of item ids", status_code=400)
+    return set(values)
+
+def sync_favorites(user_id, add, remove=frozenset(), replace=False):
+    if not db.session.query(User.id).filter_by(id=user_id).first():
+        return jsonify({"error": "User not found"}), 404
+
+    missing = add - set(item_id for item_id, in db.session.query(Item.id).filter(Item.id.in_(add))) if add else set()
+    if missing:
+        return jsonify({"error": "Items not found", "item_ids": sorted(missing)}), 404
+
+    existing = set(item_id for item_id, in db.session.query(Favorite.item_id).filter_by(user_id=user_id))
+    added = add - existing
+    removed = existing - add if replace else (existing & remove) - add
+    # a concurrent request may insert or delete some of the same favorites first: only the rows this statement
+    # changed are counted (RETURNING), the counters of the items are recomputed when the backend can't tell
+    recount = set()
+    rows = [{"user_id": user_id, "item_id": item_id} for item_id in added]
+    inserted = insert_ignore_duplicates(Favorite.__table__, rows, returning=('item_id',))
+    if inserted is None:
+        recount |= added
+    else:
+        added = set(item_id for item_id, in inserted)
+    if removed:
+        statement = db.delete(Favorite.__table__).where(Favorite.user_id == user_id, Favorite.item_id.in_(removed))
+        if db.session.get_bind().dialect.delete_returning:
+            removed = set(item_id for item_id, in db.session.execute(statement.returning(Favorite.item_id)))
+        elif db.session.execute(statement).rowcount != len(removed):
+            recount |= removed
+    ChangeLog.record('favorite', 'upsert', sorted(added), user_id)
+    ChangeLog.record('favorite', 'delete', sorted(removed), user_id)
+    item_types = Item.count_favorites(added - recount, 1)
+    item_types.update(Item.count_favorites(removed - recount, -1))
+    if recount:
+        Item.reconcile_favorite_counts(recount)
+        item_types.update(db.session.query(Item.id, Item.type).filter(Item.id.in_(recount)))
+    db.session.commit()
+    invalidate_items(item_types)
+    favorites = (existing - removed) | add
+    return jsonify({"added": sorted(added), "removed": sorted(removed), "favorites": sorted(favorites)}), 200
+
+@app.route('/users/<int:user_id>/favorites', methods=['PUT'])
+def replace_favorites(user_id):
+    data = request.get_json(silent=True) or {}
+    if 'item_ids' not in data:
+        return jsonify({"error": "item_ids is required"}), 400
+    item_ids = item_id_list(data, 'item_ids')
+    try:
+        return sync_favorites(user_id, item_ids, replace=True)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/users/<int:user_id>/favorites', methods=['PATCH'])
+def update_favorites(user_id):
+    data = request.get_json(silent=True) or {}
+    add = item_id_list(data, 'add')
+    remove = item_id_list(data, 'remove')
+    if not add and not remove:
+        return jsonify({"error": "add or remove is required"}), 400
+    try:
+        return sync_favorites(user_id, add, remove)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+# Checks the fields of a new item, returns the model to create and its column values or an error message
+def validate_item(data):
     name = data.get('name')
     item_type = data.get('type')
 
     if item_type not in ['character', 'vehicle', 'planet']:
-        return jsonify({"error": "Invalid item type"}), 400
+        return None, None, "Invalid item type"
 
     if not name or not item_type:
-        return jsonify({"error": "Name and type are required"}), 400
-
-    import uuid
-    item_id = str(uuid.uuid4())
+        return None, None, "Name and type are required"
 
     if item_type == 'character':
         gender = data.get('gender')
@@ -217,8 +598,8 @@ def create_item():
         eye_color = data.get('eye_color')
 
         if not gender or not birth_year or not hair_color or not eye_color:
-            return jsonify({"error": "Gender, birth year, hair color, and eye color are required for characters"}), 400
-        item = Character(id=item_id, name=name, type='character', gender=gender, birth_year=birth_year, hair_color=hair_color, eye_color=eye_color)
+            return None, None, "Gender, birth year, hair color, and eye color are required for characters"
+        return Character, dict(name=name, type='character', gender=gender, birth_year=birth_year, hair_color=hair_color, eye_color=eye_color), None
 
     elif item_type == 'vehicle':
         passengers = data.get('passengers')
@@ -227,8 +608,8 @@ def create_item():
         crew = data.get('crew')
 
         if passengers is None or cost_in_credits is None or max_atmosphering_speed is None or crew is None:
-            return jsonify({"error": "Passengers, cost in credits, max atmosphering speed, and crew are required for vehicles"}), 400
-        item = Vehicle(id=item_id, name=name, type='vehicle', passengers=passengers, cost_in_credits=cost_in_credits, max_atmosphering_speed=max_atmosphering_speed, crew=crew)
+            return None, None, "Passengers, cost in credits, max atmosphering speed, and crew are required for vehicles"
+        return Vehicle, dict(name=name, type='vehicle', passengers=passengers, cost_in_credits=cost_in_credits, max_atmosphering_speed=max_atmosphering_speed, crew=crew), None
 
     elif item_type == 'planet':
         population = data.get('population')
@@ -237,16 +618,106 @@ def create_item():
         orbital_period = data.get('orbital_period')
         rotation_period = data.get('rotation_period')
         if not climate or not terrain or population is None or not orbital_period or not rotation_period:
-            return jsonify({"error": "Climate, terrain, population, orbital_period, and rotation_period are required for planets"}), 400
-        item = Planet(id=item_id, name=name, type='planet', climate=climate, terrain=terrain, population=population, orbital_period=orbital_period, rotation_period=rotation_period)
+            return None, None, "Climate, terrain, population, orbital_period, and rotation_period are required for planets"
+        return Planet, dict(name=name, type='planet', climate=climate, terrain=terrain, population=population, orbital_period=orbital_period, rotation_period=rotation_period), None
+
+#Endpoint to create a new item
+@app.route('/items', methods=['POST'])
+def create_item():
+    data = request.get_json()
+    model, values, error = validate_item(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    item = model(id=str(uuid.uuid4()), **values)
 
     try:
         db.session.add(item)
+        item.touch()
         db.session.commit()
+        invalidate_item(item.id, item.type)
         return jsonify({"message": "Item created successfully", "item": item.serialize()}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Bulk creation, the body is a JSON array of items or NDJSON (one item per line, read as a stream).
+# Rows are validated one by one and inserted with one executemany per table and one transaction per chunk,
+# invalid rows or failed chunks are reported by their index and don't stop the rest of the load.
+BULK_CHUNK_SIZE = 1000
+
+def bulk_rows():
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise APIException("A JSON array of items is required", status_code=400)
+        yield from data
+
+def insert_items(rows):
+    item_columns = ['id', 'type', 'name']
+    now = utcnow()
+    db.session.execute(Item.__table__.insert(), [
+        dict({key: values[key] for key in item_columns}, version=1, updated_at=now, is_favorite=False)
+        for model, values in rows])
+    for model in [Character, Vehicle, Planet]:
+        subtype_rows = [{key: value for key, value in values.items() if key not in ('type', 'name')}
+                        for row_model, values in rows if row_model is model]
+        if subtype_rows:
+            db.session.execute(model.__table__.insert(), subtype_rows)
+
+@app.route('/items/bulk', methods=['POST'])
+def create_items_bulk():
+    created = []
+    errors = []
+    item_types = set()
+
+    def flush(chunk):
+        try:
+            insert_items([row for index, row in chunk])
+            ChangeLog.record('item', 'upsert', [values['id'] for index, (model, values) in chunk])
+            CatalogVersion.bump('item', *sorted(set(values['type'] for index, (model, values) in chunk)))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({"index": index, "error": str(e)} for index, row in chunk)
+            return
+        for index, (model, values) in chunk:
+            created.append({"index": index, "id": values['id']})
+            item_types.add(values['type'])
+
+    chunk = []
+    for index, data in enumerate(bulk_rows()):
+        if not isinstance(data, dict):
+            errors.append({"index": index, "error": "Invalid item"})
+            continue
+        model, values, error = validate_item(data)
+        if error:
+            errors.append({"index": index, "error": error})
+            continue
+        values['id'] = str(uuid.uuid4())
+        chunk.append((index, (model, values)))
+        if len(chunk) == BULK_CHUNK_SIZE:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    if item_types:
+        cache.invalidate('items')
+        cache.invalidate('popular')
+        for item_type in item_types:
+            cache.invalidate(CACHE_NAMESPACES[item_type][0])
+    status = 201 if created else 400
+    return jsonify({"created": len(created), "failed": len(errors), "items": created, "errors": errors}), status
+
 @app.route('/items', methods=['PUT'])
 def edit_item():
     data = request.get_json()
@@ -303,7 +774,9 @@ def edit_item():
         item.rotation_period = rotation_period
 
     try:
+        item.touch()
         db.session.commit()
+        invalidate_item(item.id, item.type)
         return jsonify({"message": "Item updated successfully", "item": item.serialize()}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -321,12 +794,82 @@ def remove_item():
         return jsonify({"error": "Item not found"}), 404
 
     try:
+        item_type = item.type
+        # the favorites of the item go with it, their tombstones are written in one INSERT ... SELECT
+        ChangeLog.record_deleted_favorites(Favorite.__table__.c.item_id == item_id)
         db.session.delete(item)
+        CatalogVersion.bump('item', item_type)
+        ChangeLog.record('item', 'delete', [item_id])
         db.session.commit()
+        invalidate_item(item_id, item_type)
         return jsonify({"message": "Item deleted successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Change feed for clients keeping a copy of the catalog and favorites: GET /changes?since=<token>&limit=N returns
+# the writes after the token oldest first, with the current state of the upserted items, and the token to send next.
+# The catalog writes go to everyone, the favorite writes only to their user with ?user_id=N.
+# since=latest only returns the current token, for a client that just downloaded the catalog. 410 means the client
+# has to download the catalog again (log pruned past its token or catalog replaced), then resume from "next".
+# The last CHANGES_DELAY_SECONDS of the log are held back: ids are given at insert time, so a transaction still
+# running could commit a lower id after a client read past it.
+CHANGES_DELAY = float(os.getenv("CHANGES_DELAY_SECONDS", 1))
+
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    limit = parse_limit(request.args.get('limit'), default=100, maximum=1000)
+    since = request.args.get('since')
+    user_id = request.args.get('user_id')
+    if user_id is not None and not user_id.isdigit():
+        raise APIException("user_id must be an integer", status_code=400)
+    user_id = int(user_id) if user_id is not None else None
+    try:
+        latest = db.session.query(db.func.max(ChangeLog.id)).scalar() or 0
+        if since == 'latest':
+            return jsonify({"changes": [], "next": encode_cursor(latest), "has_more": False}), 200
+        last = decode_cursor(since) if since else 0
+        if not isinstance(last, int) or isinstance(last, bool):
+            raise APIException("Invalid cursor", status_code=400)
+        first = db.session.query(db.func.min(ChangeLog.id)).scalar()
+        if first is not None and last < first - 1:
+            return jsonify({"error": "The change log was pruned, download the catalog again",
+                            "next": encode_cursor(latest)}), 410
+
+        rows = ChangeLog.read_after(last, limit + 1, user_id)
+        cutoff = utcnow() - timedelta(seconds=CHANGES_DELAY)
+        settled = []
+        for row in rows:
+            if row.created_at > cutoff:
+                break
+            if row.op == 'reset':
+                return jsonify({"error": "The catalog was replaced, download it again",
+                                "next": encode_cursor(row.id)}), 410
+            settled.append(row)
+        has_more = len(settled) > limit
+        settled = settled[:limit]
+
+        item_ids = set(row.item_id for row in settled if row.entity == 'item' and row.op == 'upsert')
+        items = {}
+        if item_ids:
+            serializer = column_serializer(Item)
+            items = {item['id']: item for item in map(serializer, serializer.query().filter(Item.id.in_(item_ids)))}
+        changes = []
+        for row in settled:
+            change = row.serialize()
+            if row.entity == 'item' and row.op == 'upsert':
+                change['item'] = items.get(row.item_id)
+            changes.append(change)
+        next_token = encode_cursor(settled[-1].id if settled else last)
+        return jsonify({"changes": changes, "next": next_token, "has_more": has_more}), 200
+    except APIException:
+        raise
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache.stats()), 200
+
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
@@ -0,0 +1,157 @@
+"""
+ASGI entry point serving the read only catalog endpoints (/items, /people, /planets, /vehicles and their detail
+routes) with an async SQLAlchemy engine, a slow query only holds a coroutine instead of a whole sync worker.
+The JSON bodies are the same as the Flask views, the statements come from the same serializers and Listing.
+
+Needs an ASGI server, greenlet (sqlalchemy[asyncio]) and the async driver of the database (asyncpg for Postgres,
+aiosqlite for SQLite):
+
+    uvicorn asgi:application --app-dir src --workers 2
+
+Writes, users and favorites stay on the WSGI app (wsgi.py).
+"""
+import os
+import re
+from urllib.parse import parse_qsl
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from werkzeug.datastructures import MultiDict
+
+# only the catalog endpoints are served here, the admin, migrations and swagger stay on the WSGI app (see wsgi.py)
+for name in ("ENABLE_ADMIN", "ENABLE_MIGRATE", "ENABLE_SWAGGER"):
+    os.environ.setdefault(name, "0")
+
+from app import app, compressor  # noqa: E402
+from database import engine_options  # noqa: E402
+from filters import Listing, lookup_results, parse_ids  # noqa: E402
+from models import Item, Character, Planet, Vehicle, public_columns  # noqa: E402
+from serializers import column_serializer  # noqa: E402
+from utils import APIException, parse_fields  # noqa: E402
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_url(url):
+    scheme, rest = url.split('://', 1)
+    return ASYNC_DRIVERS.get(scheme.split('+')[0], scheme) + '://' + rest
+
+
+def async_engine_options(url):
+    options = engine_options(url)
+    # the sync pool classes can't be used by an async engine, keep the default async queue pool
+    if options.get('poolclass') is not NullPool:
+        options.pop('poolclass', None)
+    # asyncpg takes server settings instead of libpq options
+    if 'connect_args' in options and url.startswith('postgresql'):
+        timeout = options['connect_args']['options'].split('=')[1]
+        options['connect_args'] = {'server_settings': {'statement_timeout': timeout}}
+    return options
+
+
+database_url = app.config['SQLALCHEMY_DATABASE_URI']
+engine = create_async_engine(async_url(database_url), **async_engine_options(database_url))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+def dumps(obj):
+    # same encoding as flask.jsonify outside debug mode
+    return (app.json.dumps(obj, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+async def lookup_view(args):
+    ids = parse_ids(args['ids'])
+    fields = parse_fields(args.get('fields'), public_columns(Item))
+    serializer = column_serializer(Item, tuple(fields) if fields else None)
+    async with Session() as session:
+        rows = (await session.execute(serializer.statement().where(Item.id.in_(ids)))).all()
+    return 200, lookup_results(ids, [serializer(row) for row in rows])
+
+
+async def list_view(model, not_found_message, args):
+    if model is Item and 'ids' in args:
+        return await lookup_view(args)
+    if model is Item and args.get('load', 'columns') not in ['columns', 'selectin', 'joined']:
+        return 400, {"error": "load must be columns, selectin or joined"}
+    listing = Listing(model, args)
+    serializer = column_serializer(model, tuple(listing.fields) if listing.fields else None)
+    statement = listing.apply(serializer.statement(), engine.dialect.name)
+    async with Session() as session:
+        rows = (await session.execute(statement)).all()
+    if not rows:
+        return 404, {"error": not_found_message}
+    rows, next_cursor = listing.page(rows)
+    results = [serializer(row) for row in rows]
+    if listing.paginated:
+        return 200, {"results": results, "next": next_cursor}
+    return 200, results
+
+
+async def detail_view(model, not_found_message, args, item_id):
+    serializer = column_serializer(model)
+    async with Session() as session:
+        row = (await session.execute(serializer.statement().where(model.id == item_id))).first()
+    if row is None:
+        return 404, {"error": not_found_message}
+    return 200, serializer(row)
+
+
+ROUTES = [
+    (re.compile(r'^/items/?$'), lambda args: list_view(Item, "No items found", args)),
+    (re.compile(r'^/people/?$'), lambda args: list_view(Character, "No people found", args)),
+    (re.compile(r'^/planets/?$'), lambda args: list_view(Planet, "No planets found", args)),
+    (re.compile(r'^/vehicles/?$'), lambda args: list_view(Vehicle, "No vehicles found", args)),
+    (re.compile(r'^/people/([^/]+)/?$'), lambda args, uid: detail_view(Character, "Character not found", args, uid)),
+    (re.compile(r'^/planets/([^/]+)/?$'), lambda args, uid: detail_view(Planet, "Planet not found", args, uid)),
+    (re.compile(r'^/vehicles/([^/]+)/?$'), lambda args, uid: detail_view(Vehicle, "Vehicle not found", args, uid)),
+]
+
+
+async def dispatch(method, path, args):
+    for pattern, view in ROUTES:
+        match = pattern.match(path)
+        if match:
+            if method not in ('GET', 'HEAD'):
+                return 405, {"error": "Method not allowed"}
+            try:
+                return await view(args, *match.groups())
+            except APIException as error:
+                return error.status_code, error.to_dict()
+            except Exception as e:
+                return 500, {"error": str(e)}
+    return 404, {"error": "Not found"}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+    status, payload = await dispatch(scope['method'], scope['path'], args)
+    body = dumps(payload)
+    headers = [(b'content-type', b'application/json')]
+    if compressor.enabled:
+        headers.append((b'vary', b'Accept-Encoding'))
+        accept_encoding = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        encoding = compressor.negotiate(accept_encoding) if len(body) >= compressor.min_size else None
+        if encoding is not None and 200 <= status < 300:
+            body = compressor.compress(body, encoding)
+            headers.append((b'content-encoding', encoding.encode()))
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers,
+    })
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
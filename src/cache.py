@@ -0,0 +1,177 @@
+"""
+In process cache for the JSON bodies of the catalog endpoints, bounded in size (LRU) and in time (TTL).
+Each gunicorn worker has its own cache, writes invalidate the local entries and the TTL bounds how long
+another worker can keep serving a stale body. With a Compressor (compress.py) an entry also keeps the compressed
+variants of the body, each one compressed on the first request asking for it.
+"""
+import time
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+from threading import Lock
+from flask import Response, make_response, request
+
+
+class ResponseCache:
+    # scope() returns what the body depends on besides the request, part of the key (the database the
+    # request reads from when some requests go to the replicas)
+    def __init__(self, max_entries=1024, ttl=60, compressor=None, scope=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.compressor = compressor
+        self.scope = scope
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    # Returns (variants, validators) or None
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, variants, validators = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return variants, validators
+
+    # variants maps a Content-Encoding to the body, None to the plain one. validators is the (etag, last_modified)
+    # of the body, kept with it since the writes that change them invalidate the entry too
+    def set(self, key, variants, validators=None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, variants, validators)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    # Drops every entry of a namespace, or only the ones of a single resource id
+    def invalidate(self, namespace, ident=None):
+        with self.lock:
+            keys = [key for key in self.entries
+                    if key[0] == namespace and (ident is None or key[1] == (ident,))]
+            for key in keys:
+                del self.entries[key]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    # Response for the encoding negotiated by the compressor, the missing variant is compressed and kept
+    def respond(self, variants, encoding, response=None):
+        if response is None:
+            response = Response(variants[None], mimetype='application/json')
+        if self.compressor is None:
+            return response
+        if encoding is not None and len(variants[None]) < self.compressor.min_size:
+            encoding = None
+        if encoding is not None and encoding not in variants:
+            variants[encoding] = self.compressor.compress(variants[None], encoding)
+        return self.compressor.apply(response, encoding, variants.get(encoding))
+
+    # Decorator for GET views, the key is the namespace, the url parameters and the query string.
+    # Only 200 responses that are not streamed are stored. With resolve (see conditional) the entry keeps the ETag
+    # and Last-Modified of the body, a hit answers the conditional requests without querying the versions again.
+    def cached(self, namespace, resolve=None):
+        def decorator(view):
+            uncached = conditional(resolve)(view) if resolve is not None else view
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or 'application/x-ndjson' in request.headers.get('Accept', ''):
+                    return uncached(*args, **kwargs)
+                key = (namespace, tuple(kwargs.values()), tuple(sorted(request.args.items(multi=True))),
+                       self.scope() if self.scope is not None else None)
+                encoding = None
+                if self.compressor is not None:
+                    encoding = self.compressor.negotiate(request.headers.get('Accept-Encoding'))
+                entry = self.get(key)
+                if entry is not None:
+                    variants, validators = entry
+                    if validators is not None and not_modified(*validators):
+                        return with_validators(Response(status=304), *validators)
+                    response = self.respond(variants, encoding)
+                    return with_validators(response, *validators) if validators is not None else response
+
+                # the versions are read before the body, a write in between leaves an older ETag on a newer body
+                validators = read_validators(resolve, kwargs) if resolve is not None else None
+                if validators is not None and not_modified(*validators):
+                    return with_validators(Response(status=304), *validators)
+                response = view(*args, **kwargs)
+                response, status = response if isinstance(response, tuple) else (response, 200)
+                if status == 200 and not response.is_streamed:
+                    variants = {None: response.get_data()}
+                    self.set(key, variants, validators)
+                    response = self.respond(variants, encoding, response)
+                    return with_validators(response, *validators) if validators is not None else response
+                return response, status
+            return wrapper
+        return decorator
+
+
+def read_validators(resolve, kwargs):
+    validators = resolve(**kwargs)
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    return etag, last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+# A matching If-None-Match, or If-Modified-Since without it
+def not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    return response
+
+
+# Decorator for GET views answering conditional requests. resolve(**url_params) returns (etag, last_modified)
+# read from the version columns, or None to let the view answer (for example with a 404).
+# A matching If-None-Match (or If-Modified-Since without it) returns 304 before the view runs.
+# The ETags are weak: they name the version of the data, the same for the plain and the compressed bodies.
+# The cached views pass resolve to ResponseCache.cached instead, which keeps the validators with the body.
+def conditional(resolve):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            validators = read_validators(resolve, kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+            if not_modified(*validators):
+                return with_validators(Response(status=304), *validators)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            return with_validators(response, *validators)
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+"""
+Maintenance commands, run from the src folder with `flask --app app <command>`.
+"""
+import time
+from datetime import timedelta
+import click
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Item, ChangeLog, utcnow
+from snapshot import CHUNK_SIZE, export_snapshot, import_snapshot
+
+
+def setup_commands(app):
+
+    # The favorite counters are updated by the API, this fixes the drift left by writes made elsewhere
+    # (the admin, manual SQL). Safe to run from a cron job while the API is serving.
+    @app.cli.command('reconcile-favorites')
+    def reconcile_favorites():
+        fixed = Item.reconcile_favorite_counts()
+        db.session.commit()
+        click.echo("%d item counters fixed" % fixed)
+
+    # Deletes the change log entries older than the given number of days, the newest one is always kept so the
+    # clients with an older token can tell they have to download the catalog again
+    @app.cli.command('prune-changes')
+    @click.option('--days', default=30, show_default=True, help='Days of changes to keep.')
+    def prune_changes(days):
+        before = utcnow() - timedelta(days=days)
+        newest = db.session.query(db.func.max(ChangeLog.id)).scalar()
+        deleted = db.session.query(ChangeLog).filter(ChangeLog.created_at < before, ChangeLog.id != newest) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        click.echo("%d changes deleted" % deleted)
+
+    # Catalog snapshots, see snapshot.py for the format
+    @app.cli.group('snapshot')
+    def snapshot():
+        pass
+
+    @snapshot.command('export')
+    @click.argument('path')
+    @click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Rows per chunk file.')
+    def export_command(path, chunk_size):
+        start = time.perf_counter()
+        manifest = export_snapshot(path, chunk_size)
+        for entry in manifest['tables']:
+            click.echo("%s: %d rows in %d chunks" % (entry['name'], entry['rows'], len(entry['chunks'])))
+        click.echo("Exported in %.1fs" % (time.perf_counter() - start))
+
+    @snapshot.command('import')
+    @click.argument('path')
+    @click.option('--replace', is_flag=True, help='Delete the current catalog and favorites first.')
+    def import_command(path, replace):
+        start = time.perf_counter()
+        try:
+            loaded = import_snapshot(path, replace)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise click.ClickException("Import failed, nothing was loaded (use --replace on a database that "
+                                       "already has a catalog): %s" % getattr(e, 'orig', e))
+        for name, rows in loaded.items():
+            click.echo("%s: %d rows" % (name, rows))
+        click.echo("Imported in %.1fs" % (time.perf_counter() - start))
@@ -0,0 +1,86 @@
+"""
+Negotiated response compression (Accept-Encoding) for the JSON bodies over COMPRESS_MIN_SIZE bytes (1024 by
+default). zstd and br are used when the zstandard and brotli packages are installed, gzip always:
+
+    COMPRESS_ENCODINGS=zstd,br,gzip    encodings offered, in order of preference, empty disables compression
+    COMPRESS_ZSTD_LEVEL=3 COMPRESS_BR_LEVEL=5 COMPRESS_GZIP_LEVEL=6
+
+The cached catalog responses keep their compressed variants next to the plain body (see cache.py), every other
+response is compressed after the request.
+"""
+import gzip
+import os
+from flask import request
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+
+class Compressor:
+    def __init__(self, encodings=('zstd', 'br', 'gzip'), min_size=1024, levels=None):
+        levels = dict({'zstd': 3, 'br': 5, 'gzip': 6}, **(levels or {}))
+        codecs = {'gzip': lambda body: gzip.compress(body, compresslevel=levels['gzip'], mtime=0)}
+        if brotli is not None:
+            codecs['br'] = lambda body: brotli.compress(body, quality=levels['br'])
+        if zstandard is not None:
+            # a ZstdCompressor is not thread safe, one per call is cheap
+            codecs['zstd'] = lambda body: zstandard.ZstdCompressor(level=levels['zstd']).compress(body)
+        self.codecs = codecs
+        self.encodings = [encoding for encoding in encodings if encoding in codecs]
+        self.min_size = min_size
+
+    @classmethod
+    def from_env(cls):
+        encodings = [name.strip() for name in os.getenv('COMPRESS_ENCODINGS', 'zstd,br,gzip').split(',')
+                     if name.strip()]
+        levels = {name: int(os.environ['COMPRESS_%s_LEVEL' % name.upper()])
+                  for name in ('zstd', 'br', 'gzip') if 'COMPRESS_%s_LEVEL' % name.upper() in os.environ}
+        return cls(encodings, int(os.getenv('COMPRESS_MIN_SIZE', 1024)), levels)
+
+    @property
+    def enabled(self):
+        return bool(self.encodings)
+
+    # Best encoding allowed by an Accept-Encoding header, None for the plain body
+    def negotiate(self, accept_encoding):
+        if not self.encodings or not accept_encoding:
+            return None
+        return parse_accept_header(accept_encoding, Accept).best_match(self.encodings)
+
+    def compressible(self, response):
+        return (response.mimetype in COMPRESSIBLE_MIMETYPES and not response.is_streamed
+                and not response.direct_passthrough and 'Content-Encoding' not in response.headers
+                and 200 <= response.status_code < 300 and response.status_code != 204)
+
+    def compress(self, body, encoding):
+        return self.codecs[encoding](body)
+
+    # Puts an already compressed body (or compresses the plain one) in the response
+    def apply(self, response, encoding, body=None):
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+        response.set_data(body if body is not None else self.compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def init_app(self, app):
+        @app.after_request
+        def compress_response(response):
+            if not self.compressible(response):
+                return response
+            if response.content_length is not None and response.content_length < self.min_size:
+                response.vary.add('Accept-Encoding')
+                return response
+            return self.apply(response, self.negotiate(request.headers.get('Accept-Encoding')))
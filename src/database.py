@@ -0,0 +1,85 @@
+"""
+Engine options from the environment, every gunicorn worker gets its own pool sized by these variables:
+
+    DB_POOL_SIZE=5 DB_MAX_OVERFLOW=10 DB_POOL_TIMEOUT=30   connections kept, extra ones and wait for a free one (s)
+    DB_POOL_RECYCLE=1800                                   reopen connections older than this (s), -1 disables
+    DB_POOL_PRE_PING=1                                     test connections on checkout, avoids stale ones after idle
+    DB_STATEMENT_TIMEOUT=0                                 Postgres statement_timeout in ms, 0 disables
+    DB_POOLER=pgbouncer                                    an external pooler is in front, don't pool in the app
+"""
+import os
+import time
+from threading import Lock
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+# QueuePool that records how long the checkouts wait for a free connection
+class TimedQueuePool(QueuePool):
+    lock = Lock()
+    stats = {'checkouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0, 'timeouts': 0}
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self.lock:
+                self.stats['timeouts'] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.lock:
+                self.stats['checkouts'] += 1
+                self.stats['wait_seconds'] += waited
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def engine_options(db_url):
+    # in memory sqlite databases live in a single connection, keep the SQLAlchemy defaults
+    if db_url.startswith('sqlite') and (db_url in ('sqlite://', 'sqlite:///') or ':memory:' in db_url):
+        return {}
+
+    options = {'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1'}
+    if os.getenv('DB_POOLER') == 'pgbouncer':
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'poolclass': TimedQueuePool,
+            'pool_size': env_int('DB_POOL_SIZE', 5),
+            'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        })
+
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT', 0)
+    if statement_timeout and db_url.startswith('postgresql'):
+        options['connect_args'] = {'options': '-c statement_timeout=%d' % statement_timeout}
+    return options
+
+
+# Prometheus lines for /metrics
+def pool_metrics(engine):
+    lines = []
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        lines += [
+            '# TYPE db_pool_size gauge', 'db_pool_size %d' % pool.size(),
+            '# TYPE db_pool_checked_out gauge', 'db_pool_checked_out %d' % pool.checkedout(),
+            '# TYPE db_pool_overflow gauge', 'db_pool_overflow %d' % pool.overflow(),
+        ]
+    with TimedQueuePool.lock:
+        stats = dict(TimedQueuePool.stats)
+    lines += [
+        '# TYPE db_pool_checkouts_total counter', 'db_pool_checkouts_total %d' % stats['checkouts'],
+        '# TYPE db_pool_checkout_wait_seconds_total counter',
+        'db_pool_checkout_wait_seconds_total %f' % stats['wait_seconds'],
+        '# TYPE db_pool_checkout_wait_seconds_max gauge',
+        'db_pool_checkout_wait_seconds_max %f' % stats['max_wait_seconds'],
+        '# TYPE db_pool_timeouts_total counter', 'db_pool_timeouts_total %d' % stats['timeouts'],
+    ]
+    return lines
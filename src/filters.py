@@ -0,0 +1,201 @@
+"""
+Filtering, sorting and name search for the list endpoints, all driven by the public columns of the model.
+
+    ?climate=arid                      equality on any public column
+    ?passengers_min=10&passengers_max=50   ranges on the integer columns
+    ?sort=-favorite_count              sort on an indexed column, - for descending, pages keep working
+    ?search=sky walk                   prefix search on the words of Item.name
+    ?ids=c001,p002                     the items with these ids in the order asked (/items only)
+"""
+import re
+from sqlalchemy import Integer, UniqueConstraint, and_, or_, func, inspect, text
+from models import db, Item, public_columns
+from utils import APIException, decode_cursor, encode_cursor, parse_fields, parse_limit
+
+# Query string parameters that are not column filters
+RESERVED_PARAMS = ('limit', 'after', 'fields', 'stream', 'load', 'include', 'sort', 'search', 'ids')
+MAX_IDS = 1000
+
+
+def column_type(model, field):
+    return inspect(model).column_attrs[field].columns[0].type
+
+
+def parse_value(model, field, value):
+    if isinstance(column_type(model, field), Integer):
+        try:
+            return int(value)
+        except ValueError:
+            raise APIException(field + " must be an integer", status_code=400)
+    return value
+
+
+def apply_filters(query, model, args):
+    columns = public_columns(model)
+    for param, value in args.items():
+        if param in RESERVED_PARAMS:
+            continue
+        field, bound = param, None
+        if param.endswith('_min') or param.endswith('_max'):
+            field, bound = param[:-4], param[-3:]
+        # parameters that are not about a column (cache busters, tracking) are ignored
+        if field not in columns:
+            continue
+        if bound and not isinstance(column_type(model, field), Integer):
+            raise APIException("Unknown filter: " + param, status_code=400)
+
+        column = getattr(model, field)
+        value = parse_value(model, field, value)
+        if bound == 'min':
+            query = query.filter(column >= value)
+        elif bound == 'max':
+            query = query.filter(column <= value)
+        else:
+            query = query.filter(column == value)
+    return query
+
+
+# The public columns leading an index (or the primary key), a sorted page is then read from the index instead of
+# sorting the whole table: id, type, name and favorite_count on the items, id and email on the users
+def sortable_columns(model):
+    fields = []
+    for field in public_columns(model):
+        column = inspect(model).column_attrs[field].columns[0]
+        leading = [index.columns.values()[0] for index in column.table.indexes]
+        leading += [constraint.columns.values()[0] for constraint in column.table.constraints
+                    if isinstance(constraint, UniqueConstraint)]
+        if column.primary_key or column.unique or any(column is other for other in leading):
+            fields.append(field)
+    return fields
+
+
+# ?sort=name or ?sort=-name, returns (field, descending) or None for the default order on the id
+def parse_sort(model, value):
+    if not value:
+        return None
+    descending = value.startswith('-')
+    field = value.lstrip('-')
+    sortable = sortable_columns(model)
+    if field not in sortable:
+        raise APIException("Unknown sort field: %s, the lists sort on %s" % (field, ", ".join(sortable)),
+                           status_code=400)
+    return field, descending
+
+
+def is_column_value(model, field, value):
+    kind = int if isinstance(column_type(model, field), Integer) else str
+    return isinstance(value, kind) and not isinstance(value, bool)
+
+
+# ?after=<cursor>: the id of the last row without a sort, [sort value, id] with one, anything else is a 400
+def parse_cursor(model, sort, value):
+    cursor = decode_cursor(value)
+    if sort is None:
+        valid = is_column_value(model, 'id', cursor)
+    else:
+        valid = (isinstance(cursor, list) and len(cursor) == 2
+                 and is_column_value(model, sort[0], cursor[0]) and is_column_value(model, 'id', cursor[1]))
+    if not valid:
+        raise APIException("Invalid cursor", status_code=400)
+    return cursor
+
+
+# Orders on the sort column with the id as tie breaker and skips what was before the cursor (keyset pagination).
+# With a sort the cursor holds [sort value, id], without it just the id.
+def order_and_seek(query, model, sort, cursor):
+    if sort is None:
+        query = query.order_by(model.id)
+        if cursor is not None:
+            query = query.filter(model.id > cursor)
+        return query
+
+    field, descending = sort
+    column = getattr(model, field)
+    query = query.order_by(column.desc() if descending else column, model.id)
+    if cursor is not None:
+        value, last_id = cursor
+        past = column < value if descending else column > value
+        query = query.filter(or_(past, and_(column == value, model.id > last_id)))
+    return query
+
+
+def cursor_for(row, sort):
+    if sort is None:
+        return row.id
+    return [getattr(row, sort[0]), row.id]
+
+
+# Name search uses the full text index of the backend: a GIN index on to_tsvector('simple', name) on Postgres
+# and the item_search FTS5 table on SQLite. Every word is matched as a prefix.
+def apply_search(query, model, value, dialect=None):
+    if not issubclass(model, Item):
+        raise APIException("search is only supported on items", status_code=400)
+    words = re.findall(r'\w+', value)
+    if not words:
+        return query
+
+    dialect = dialect or db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        terms = ' & '.join(word + ':*' for word in words)
+        return query.filter(func.to_tsvector('simple', Item.name).op('@@')(func.to_tsquery('simple', terms)))
+    if dialect == 'sqlite':
+        terms = ' '.join('"%s"*' % word for word in words)
+        return query.filter(text("item.id IN (SELECT id FROM item_search WHERE item_search MATCH :terms)")
+                            .bindparams(terms=terms))
+    return query.filter(and_(*[Item.name.ilike('%' + word + '%') for word in words]))
+
+
+# Everything a list request asks for (fields, filters, search, sort, page), shared by the Flask views and the
+# async entry point so both build the same statements. apply() works on a Query or on a select().
+class Listing:
+    def __init__(self, model, args):
+        self.model = model
+        self.args = args
+        self.fields = parse_fields(args.get('fields'), public_columns(model))
+        self.sort = parse_sort(model, args.get('sort'))
+        self.paginated = 'limit' in args or 'after' in args
+        self.limit = parse_limit(args.get('limit')) if self.paginated else None
+        after = args.get('after')
+        self.cursor = parse_cursor(model, self.sort, after) if after else None
+        if self.fields and self.sort and self.sort[0] not in self.fields:
+            # the next cursor is built from the sort column
+            self.fields.append(self.sort[0])
+
+    def apply(self, query, dialect=None):
+        query = apply_filters(query, self.model, self.args)
+        if self.args.get('search'):
+            query = apply_search(query, self.model, self.args['search'], dialect)
+        query = order_and_seek(query, self.model, self.sort, self.cursor)
+        if self.paginated:
+            query = query.limit(self.limit + 1)
+        return query
+
+    # Cuts the extra row read to know if there is a next page, returns the rows and the next cursor
+    def page(self, rows):
+        if self.paginated and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            return rows, encode_cursor(cursor_for(rows[-1], self.sort))
+        return rows, None
+
+
+# Multi get: ids from ?ids=a,b,c or a JSON list, duplicates dropped keeping the first position
+def parse_ids(value):
+    if value is None:
+        raise APIException("ids is required", status_code=400)
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(item_id, str) for item_id in value):
+        raise APIException("ids must be a list of item ids", status_code=400)
+    ids = list(dict.fromkeys(item_id.strip() for item_id in value if item_id.strip()))
+    if not ids:
+        raise APIException("ids is required", status_code=400)
+    if len(ids) > MAX_IDS:
+        raise APIException("At most %d ids per request" % MAX_IDS, status_code=400)
+    return ids
+
+
+# The rows of an Item.id.in_(ids) query put back in the order of the ids, with the ids that were not found
+def lookup_results(ids, results):
+    found = {result['id']: result for result in results}
+    return {"results": [found[item_id] for item_id in ids if item_id in found],
+            "missing": [item_id for item_id in ids if item_id not in found]}
@@ -0,0 +1,159 @@
+"""
+Opt in request instrumentation (METRICS_ENABLED=1): latency histograms, SQL query counts and time and
+serialization time per endpoint, exposed in the Prometheus text format on /metrics and per response in a
+Server-Timing header. Only counters are kept so it can stay on in production.
+
+The serialization time is the time spent building the JSON responses (jsonify), measured once for every view
+by the JSON provider of the app. Streamed lists (?stream=) are encoded after the headers are sent and report 0.
+"""
+import time
+from contextlib import contextmanager
+from threading import Lock
+from flask import Response, g, has_request_context, request
+from flask.json.provider import JSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+
+
+# Wraps the JSON provider of the app (default or orjson, see serializers.py) to time the responses it builds
+class TimedJSONProvider(JSONProvider):
+    def __init__(self, app, provider, metrics):
+        super().__init__(app)
+        self.provider = provider
+        self.metrics = metrics
+
+    def dumps(self, obj, **kwargs):
+        return self.provider.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return self.provider.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        with self.metrics.timed_serialize():
+            return self.provider.response(*args, **kwargs)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = {}
+        self.latency = {}
+        self.queries = {}
+        self.query_time = {}
+        self.serialize_time = {}
+        self.collectors = []
+        self.enabled = False
+
+    # collector() returns extra Prometheus lines added at the end of /metrics
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def init_app(self, app):
+        self.enabled = True
+        event.listen(Engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_cursor_execute)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.json = TimedJSONProvider(app, app.json, self)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view, methods=['GET'])
+
+    def before_request(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'query_time': 0.0, 'serialize_time': 0.0}
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics' in g:
+            g.metrics['query_start'] = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics' in g and 'query_start' in g.metrics:
+            g.metrics['queries'] += 1
+            g.metrics['query_time'] += time.perf_counter() - g.metrics.pop('query_start')
+
+    def after_request(self, response):
+        if 'metrics' not in g:
+            return response
+        timings = g.metrics
+        elapsed = time.perf_counter() - timings['start']
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, endpoint)
+        with self.lock:
+            status_key = key + (response.status_code,)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            self.latency.setdefault(key, Histogram()).observe(elapsed)
+            self.queries[key] = self.queries.get(key, 0) + timings['queries']
+            self.query_time[key] = self.query_time.get(key, 0.0) + timings['query_time']
+            self.serialize_time[key] = self.serialize_time.get(key, 0.0) + timings['serialize_time']
+
+        response.headers['Server-Timing'] = ', '.join([
+            'db;dur=%.2f;desc="%d queries"' % (timings['query_time'] * 1000, timings['queries']),
+            'serialize;dur=%.2f' % (timings['serialize_time'] * 1000),
+            'total;dur=%.2f' % (elapsed * 1000),
+        ])
+        return response
+
+    def render(self):
+        lines = []
+
+        def labels(key, status=None):
+            method, endpoint = key[0], key[1]
+            text = 'method="%s",endpoint="%s"' % (method, endpoint)
+            if status is not None:
+                text += ',status="%s"' % status
+            return text
+
+        with self.lock:
+            lines.append('# TYPE http_requests_total counter')
+            for key, count in sorted(self.requests.items()):
+                lines.append('http_requests_total{%s} %d' % (labels(key, key[2]), count))
+
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for key, histogram in sorted(self.latency.items()):
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    lines.append('http_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels(key), bound, count))
+                lines.append('http_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels(key), histogram.count))
+                lines.append('http_request_duration_seconds_sum{%s} %f' % (labels(key), histogram.sum))
+                lines.append('http_request_duration_seconds_count{%s} %d' % (labels(key), histogram.count))
+
+            for name, values, kind in [('db_queries_total', self.queries, '%d'),
+                                       ('db_query_duration_seconds_total', self.query_time, '%f'),
+                                       ('serialize_duration_seconds_total', self.serialize_time, '%f')]:
+                lines.append('# TYPE %s counter' % name)
+                for key, value in sorted(values.items()):
+                    lines.append(('%s{%s} ' + kind) % (name, labels(key), value))
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    # Adds the time spent in the block to the serialization time of the current request
+    @contextmanager
+    def timed_serialize(self):
+        if not self.enabled or not has_request_context() or 'metrics' not in g:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            g.metrics['serialize_time'] += time.perf_counter() - start
+
+
+metrics = Metrics()
@@ -1,10 +1,49 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import String, Boolean, DateTime, DDL, event, inspect
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.orm import relationship
 from typing import List
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Columns that are never sent to the clients
+HIDDEN_COLUMNS = ('password', 'is_favorite', 'version', 'updated_at')
+
+
+# INSERT that skips rows already present (ON CONFLICT DO NOTHING / INSERT IGNORE) on the supported backends.
+# Returns the values of the returning columns for the rows actually inserted, or None when the backend can't
+# tell which rows were skipped (no RETURNING and fewer rows inserted than sent).
+def insert_ignore_duplicates(table, rows, returning=()):
+    if not rows:
+        return []
+    dialect = db.session.get_bind().dialect
+    if dialect.name == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect.name == 'sqlite':
+        statement = sqlite.insert(table).on_conflict_do_nothing()
+    elif dialect.name == 'mysql':
+        statement = table.insert().prefix_with('IGNORE')
+    else:
+        statement = table.insert()
+    if returning and dialect.insert_executemany_returning:
+        columns = [table.c[name] for name in returning]
+        return [tuple(row) for row in db.session.execute(statement.returning(*columns), rows)]
+    result = db.session.execute(statement, rows)
+    if result.rowcount != len(rows):
+        return None
+    return [tuple(row[name] for name in returning) for row in rows]
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def public_columns(model):
+    return [attr.key for attr in inspect(model).column_attrs
+            if attr.key not in HIDDEN_COLUMNS]
 
 
 class User(db.Model):
@@ -19,38 +58,171 @@ class User(db.Model):
     favorites: Mapped[List["Favorite"]] = relationship(
         "Favorite", back_populates="user")
 
-    def serialize(self):
-        return {
+    # label of the user in the admin
+    def __str__(self):
+        return self.email
+
+    def serialize(self, include_favorites=True):
+        data = {
             'id': self.id,
             'email': self.email,
             'sub_date': self.sub_date,
             'first_name': self.first_name,
             'last_name': self.last_name,
-            'favorites': [fav.item_id for fav in self.favorites]
         }
+        if include_favorites:
+            data['favorites'] = [fav.item_id for fav in self.favorites]
+        return data
+
+    # Deletes the users and their favorites (see Favorite.delete_many), returns the number of users deleted and
+    # {item id: item type} of the items whose favorite count changed
+    @classmethod
+    def delete_many(cls, user_ids):
+        user_ids = list(user_ids)
+        _, types = Favorite.delete_many(Favorite.__table__.c.user_id.in_(user_ids))
+        deleted = db.session.execute(db.delete(cls.__table__).where(cls.__table__.c.id.in_(user_ids))).rowcount
+        return deleted, types
 
 
 class Item(db.Model):
     __tablename__ = 'item'
+    # polymorphic lists filter on type and page on id, the popular items are read from the favorite_count indexes
+    __table_args__ = (
+        db.Index('ix_item_type', 'type', 'id'),
+        db.Index('ix_item_popular', 'favorite_count', 'id'),
+        db.Index('ix_item_type_popular', 'type', 'favorite_count', 'id'),
+    )
     id: Mapped[str] = mapped_column(String(100), primary_key=True)
     type: Mapped[str] = mapped_column(String(50), nullable=False)
-    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
     favorites: Mapped[List["Favorite"]] = relationship(
         "Favorite", back_populates="item",
         cascade="all, delete-orphan")
     is_favorite: Mapped[bool] = mapped_column(Boolean, default=False)
+    # number of favorites, kept up to date by every favorite write (see count_favorites)
+    favorite_count: Mapped[int] = mapped_column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False, default=1)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=utcnow)
     __mapper_args__ = {
         'polymorphic_identity': 'item',
         'polymorphic_on': type
     }
 
+    # label of the item in the admin
+    def __str__(self):
+        return '%s (%s)' % (self.name, self.id)
+
     def serialize(self):
         return {
             'id': self.id,
             'type': self.type,
             'name': self.name,
+            'favorite_count': self.favorite_count,
         }
 
+    # Called by every write before the commit so the ETag of the item and of its collections change
+    def touch(self):
+        self.version = (self.version or 0) + 1
+        self.updated_at = utcnow()
+        CatalogVersion.bump('item', self.type)
+        ChangeLog.record('item', 'upsert', [self.id])
+
+    # Adds delta to the favorite count of the items in the same transaction as the favorite rows, the version of
+    # the items changes too since favorite_count is part of their payload. Returns {item id: item type}.
+    @classmethod
+    def count_favorites(cls, item_ids, delta):
+        if not item_ids:
+            return {}
+        item_ids = list(item_ids)
+        db.session.execute(
+            db.update(cls.__table__).where(cls.__table__.c.id.in_(item_ids))
+            .values(favorite_count=cls.__table__.c.favorite_count + delta,
+                    version=cls.__table__.c.version + 1, updated_at=utcnow()))
+        types = dict(db.session.query(cls.id, cls.type).filter(cls.id.in_(item_ids)))
+        CatalogVersion.bump('item', *sorted(set(types.values())))
+        ChangeLog.record('item', 'upsert', sorted(types))
+        return types
+
+    # Recomputes the counters from the favorite table (of every item or only of item_ids), returns how many items
+    # were off
+    @classmethod
+    def reconcile_favorite_counts(cls, item_ids=None):
+        item = cls.__table__
+        actual = db.select(db.func.count()).where(Favorite.__table__.c.item_id == item.c.id).scalar_subquery()
+        stale = db.select(item.c.id).where(item.c.favorite_count != actual)
+        if item_ids is not None:
+            stale = stale.where(item.c.id.in_(list(item_ids)))
+        item_ids = [item_id for item_id, in db.session.execute(stale)]
+        if item_ids:
+            db.session.execute(
+                db.update(item).where(item.c.id.in_(item_ids))
+                .values(favorite_count=actual, version=item.c.version + 1, updated_at=utcnow()))
+            CatalogVersion.bump('item', 'character', 'planet', 'vehicle')
+            ChangeLog.record('item', 'upsert', item_ids)
+        return len(item_ids)
+
+    # Deletes the items and their favorites with one statement per table whatever the number of items, with the
+    # tombstones of both in the change log. Returns {item id: item type} of the deleted items.
+    @classmethod
+    def delete_many(cls, item_ids):
+        types = dict(db.session.query(cls.id, cls.type).filter(cls.id.in_(list(item_ids))))
+        if not types:
+            return {}
+        item_ids = sorted(types)
+        favorite = Favorite.__table__
+        ChangeLog.record_deleted_favorites(favorite.c.item_id.in_(item_ids))
+        db.session.execute(db.delete(favorite).where(favorite.c.item_id.in_(item_ids)))
+        for model in (Character, Planet, Vehicle):
+            db.session.execute(db.delete(model.__table__).where(model.__table__.c.id.in_(item_ids)))
+        db.session.execute(db.delete(cls.__table__).where(cls.__table__.c.id.in_(item_ids)))
+        CatalogVersion.bump('item', *sorted(set(types.values())))
+        ChangeLog.record('item', 'delete', item_ids)
+        return types
+
+
+# Full text index on the item names, used by ?search= (see filters.py). SQLite keeps an FTS5 table in sync
+# with triggers, Postgres uses a GIN expression index. The migrations create the same objects.
+# item has a text primary key and no stable rowid (VACUUM or a table rebuild renumber it): the FTS5 table stores
+# the item id, and its rowid is the key of the id in item_search_key (an INTEGER PRIMARY KEY is never renumbered)
+# so the triggers find the row to delete without scanning the table.
+ITEM_SEARCH_SQLITE_INSERT = (
+    "INSERT INTO item_search_key(id) VALUES (new.id); "
+    "INSERT INTO item_search(rowid, id, name) "
+    "VALUES ((SELECT key FROM item_search_key WHERE id = new.id), new.id, new.name); "
+)
+ITEM_SEARCH_SQLITE_DELETE = (
+    "DELETE FROM item_search WHERE rowid = (SELECT key FROM item_search_key WHERE id = old.id); "
+    "DELETE FROM item_search_key WHERE id = old.id; "
+)
+ITEM_SEARCH_SQLITE = [
+    "CREATE TABLE IF NOT EXISTS item_search_key (key INTEGER PRIMARY KEY, id VARCHAR(100) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(id UNINDEXED, name)",
+    "CREATE TRIGGER IF NOT EXISTS item_search_insert AFTER INSERT ON item BEGIN "
+    + ITEM_SEARCH_SQLITE_INSERT + "END",
+    "CREATE TRIGGER IF NOT EXISTS item_search_delete AFTER DELETE ON item BEGIN "
+    + ITEM_SEARCH_SQLITE_DELETE + "END",
+    "CREATE TRIGGER IF NOT EXISTS item_search_update AFTER UPDATE OF id, name ON item BEGIN "
+    + ITEM_SEARCH_SQLITE_DELETE + ITEM_SEARCH_SQLITE_INSERT + "END",
+    # rebuild
+    "DELETE FROM item_search",
+    "DELETE FROM item_search_key",
+    "INSERT INTO item_search_key(id) SELECT id FROM item",
+    "INSERT INTO item_search(rowid, id, name) "
+    "SELECT item_search_key.key, item.id, item.name FROM item JOIN item_search_key ON item_search_key.id = item.id",
+]
+ITEM_SEARCH_POSTGRESQL = [
+    "CREATE INDEX IF NOT EXISTS ix_item_name_search ON item USING gin (to_tsvector('simple', name))",
+]
+
+for statement in ITEM_SEARCH_SQLITE:
+    event.listen(Item.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for table in ('item_search', 'item_search_key'):
+    event.listen(Item.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS " + table).execute_if(dialect='sqlite'))
+for statement in ITEM_SEARCH_POSTGRESQL:
+    event.listen(Item.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
 
 class Character(Item):
     __tablename__ = 'character'
@@ -125,6 +297,8 @@ class Planet(Item):
 
 
 class Favorite(db.Model):
+    # the primary key starts with item_id, lookups by user need their own index (covering the item ids)
+    __table_args__ = (db.Index('ix_favorite_user_id', 'user_id', 'item_id'),)
     item_id: Mapped[str] = mapped_column(
         db.ForeignKey('item.id'), primary_key=True)
     user_id: Mapped[str] = mapped_column(
@@ -137,3 +311,110 @@ class Favorite(db.Model):
             'item_id': self.item_id,
             'user_id': self.user_id
         }
+
+    # Deletes the favorites matching condition in one statement, logs their tombstones and updates the counters
+    # of their items. Returns the number of favorites deleted and {item id: item type} of the items whose count
+    # changed.
+    @classmethod
+    def delete_many(cls, condition):
+        table = cls.__table__
+        per_item = dict(db.session.execute(
+            db.select(table.c.item_id, db.func.count()).where(condition).group_by(table.c.item_id)).all())
+        if not per_item:
+            return 0, {}
+        ChangeLog.record_deleted_favorites(condition)
+        db.session.execute(db.delete(table).where(condition))
+        # one counter update per distinct number of favorites removed from an item
+        by_delta = {}
+        for item_id, count in per_item.items():
+            by_delta.setdefault(count, []).append(item_id)
+        types = {}
+        for count, item_ids in sorted(by_delta.items()):
+            types.update(Item.count_favorites(item_ids, -count))
+        return sum(per_item.values()), types
+
+
+# One row per collection ('item' and every item type), bumped in the same transaction as the writes
+# so the list endpoints can answer conditional requests without reading the items
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=utcnow)
+
+    @classmethod
+    def bump(cls, *names):
+        now = utcnow()
+        for name in names:
+            updated = db.session.execute(
+                db.update(cls).where(cls.name == name)
+                .values(version=cls.version + 1, updated_at=now)).rowcount
+            if not updated:
+                db.session.add(cls(name=name, version=1, updated_at=now))
+
+    def serialize(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+# Append only log of the catalog and favorite writes, recorded in the same transaction as each write and read
+# by GET /changes. Ids only grow (AUTOINCREMENT on SQLite too) so a client resumes after the last id it saw.
+# entity is 'item' or 'favorite' (with user_id), op is 'upsert', 'delete' (tombstone) or 'reset' when the whole
+# catalog was replaced and the clients have to download it again.
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    # the catalog writes (no user) and the favorite writes of one user are read in id order from the same index
+    __table_args__ = (
+        db.Index('ix_change_log_user_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+    id: Mapped[int] = mapped_column(db.Integer, primary_key=True)
+    entity: Mapped[str] = mapped_column(String(20), nullable=False)
+    op: Mapped[str] = mapped_column(String(10), nullable=False)
+    item_id: Mapped[str] = mapped_column(String(100), nullable=True)
+    user_id: Mapped[int] = mapped_column(db.Integer, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=utcnow)
+
+    @classmethod
+    def record(cls, entity, op, item_ids=(None,), user_id=None):
+        now = utcnow()
+        rows = [{'entity': entity, 'op': op, 'item_id': item_id, 'user_id': user_id, 'created_at': now}
+                for item_id in item_ids]
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+
+    # Tombstones of the favorites matching condition, copied with INSERT ... SELECT before they are deleted
+    @classmethod
+    def record_deleted_favorites(cls, condition):
+        favorite = Favorite.__table__
+        rows = db.select(db.literal('favorite'), db.literal('delete'), favorite.c.item_id, favorite.c.user_id,
+                         db.literal(utcnow(), DateTime)).where(condition)
+        db.session.execute(cls.__table__.insert().from_select(
+            ['entity', 'op', 'item_id', 'user_id', 'created_at'], rows))
+
+    # The first limit rows after last_id: the catalog rows, and the favorite rows of user_id when given. One
+    # range of ix_change_log_user_id per scope, merged here, instead of an OR that has to sort every match.
+    @classmethod
+    def read_after(cls, last_id, limit, user_id=None):
+        scopes = [None] if user_id is None else [None, user_id]
+        rows = []
+        for scope in scopes:
+            rows += (cls.query.filter(cls.user_id.is_(scope) if scope is None else cls.user_id == scope,
+                                      cls.id > last_id)
+                     .order_by(cls.id).limit(limit).all())
+        return sorted(rows, key=lambda row: row.id)[:limit]
+
+    def serialize(self):
+        data = {
+            'entity': self.entity,
+            'op': self.op,
+            'item_id': self.item_id,
+        }
+        if self.entity == 'favorite':
+            data['user_id'] = self.user_id
+        return data
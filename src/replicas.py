@@ -0,0 +1,102 @@
+"""
+Read replica routing. With DATABASE_READ_URLS set (comma separated), GET requests run their queries on the
+replicas in round robin and every other method stays on the primary (DATABASE_URL).
+
+After a successful write the client gets a short lived cookie that keeps its reads on the primary
+(DB_READ_STICKY_SECONDS, 5 by default) so it reads its own writes despite the replication lag.
+Every replica is probed with SELECT 1 before its first request. One that fails with a connection error is
+skipped for DB_REPLICA_COOLDOWN seconds (30 by default), then probed again before getting traffic back.
+"""
+import os
+import time
+from threading import Lock
+from flask import request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from database import engine_options
+
+STICKY_COOKIE = 'read_primary'
+
+
+# Session sending its reads to the replica chosen for the request, flushes always go to the primary
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None and not self._flushing:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class Replica:
+    def __init__(self, url):
+        self.url = url
+        self.engine = create_engine(url, **engine_options(url))
+        self.down_until = 0.0
+        # probed before its first use, like after a failure
+        self.probed = False
+        event.listen(self.engine, 'handle_error', self.handle_error)
+
+    def handle_error(self, context):
+        # lost connections and failures to connect, not errors of the statements themselves
+        if context.is_disconnect or context.connection is None:
+            self.mark_down()
+
+    def mark_down(self):
+        self.down_until = time.monotonic() + int(os.getenv('DB_REPLICA_COOLDOWN', 30))
+
+    def healthy(self):
+        if self.probed and self.down_until == 0.0:
+            return True
+        if time.monotonic() < self.down_until:
+            return False
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception:
+            self.mark_down()
+            return False
+        self.down_until = 0.0
+        self.probed = True
+        return True
+
+
+class ReplicaRouter:
+    def __init__(self, urls):
+        self.replicas = [Replica(url) for url in urls]
+        self.lock = Lock()
+        self.next = 0
+
+    # Next healthy replica in round robin, None sends the reads to the primary
+    def pick(self):
+        with self.lock:
+            start = self.next
+            self.next = (self.next + 1) % len(self.replicas)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.healthy():
+                return replica
+        return None
+
+    def init_app(self, app, db):
+        sticky_seconds = int(os.getenv('DB_READ_STICKY_SECONDS', 5))
+
+        @app.before_request
+        def route_reads():
+            if request.method in ('GET', 'HEAD') and not request.cookies.get(STICKY_COOKIE):
+                replica = self.pick()
+                if replica is not None:
+                    db.session.info['replica'] = replica.engine
+
+        @app.after_request
+        def stick_to_primary(response):
+            if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and sticky_seconds:
+                response.set_cookie(STICKY_COOKIE, '1', max_age=sticky_seconds, httponly=True)
+            return response
+
+    def dispose(self, close=True):
+        for replica in self.replicas:
+            replica.engine.dispose(close=close)
+
+    def status(self):
+        return [{'url': replica.engine.url.render_as_string(hide_password=True),
+                 'healthy': replica.probed and replica.down_until == 0.0} for replica in self.replicas]
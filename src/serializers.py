@@ -0,0 +1,86 @@
+"""
+Column driven serializers for the list endpoints, they are built once per mapped class from the mapper
+columns and work on the row tuples of column only queries so no ORM instance is created per row.
+"""
+import os
+from functools import lru_cache
+from operator import itemgetter
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import with_polymorphic
+from models import db, public_columns
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ColumnSerializer:
+    def __init__(self, model, fields=None):
+        self.model = model
+        self.fields = tuple(fields or public_columns(model))
+        self.columns = [getattr(model, field) for field in self.fields]
+
+    def query(self):
+        return db.session.query(*self.columns)
+
+    def statement(self):
+        return select(*self.columns)
+
+    def __call__(self, row):
+        return dict(zip(self.fields, row))
+
+
+# Selects the base table outer joined with every subtype table, each row only keeps the keys of its own type
+class PolymorphicSerializer:
+    def __init__(self, model):
+        mapper = inspect(model)
+        self.model = model
+        self.entity = with_polymorphic(model, '*')
+        self.columns = []
+        positions = {}
+        self.layouts = {}
+        for submapper in mapper.self_and_descendants:
+            source = self.entity if submapper is mapper else getattr(self.entity, submapper.class_.__name__)
+            keys = public_columns(submapper.class_)
+            for key in keys:
+                if key not in positions:
+                    positions[key] = len(self.columns)
+                    self.columns.append(getattr(source, key).label(key))
+            self.layouts[submapper.polymorphic_identity] = (tuple(keys), itemgetter(*[positions[key] for key in keys]))
+        self.type_index = positions[mapper.polymorphic_on.key]
+
+    def query(self):
+        return db.session.query(*self.columns).select_from(self.entity)
+
+    def statement(self):
+        return select(*self.columns).select_from(self.entity)
+
+    def __call__(self, row):
+        keys, getter = self.layouts[row[self.type_index]]
+        return dict(zip(keys, getter(row)))
+
+
+@lru_cache(maxsize=128)
+def column_serializer(model, fields=None):
+    if fields is None and len(inspect(model).self_and_descendants) > 1:
+        return PolymorphicSerializer(model)
+    return ColumnSerializer(model, fields)
+
+
+# Optional faster JSON encoding, enabled with JSON_BACKEND=orjson when the package is installed
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def setup_json(app):
+    backend = os.environ.get('JSON_BACKEND', 'default')
+    if backend == 'orjson':
+        if orjson is None:
+            raise RuntimeError("JSON_BACKEND=orjson requires the orjson package")
+        app.json = OrjsonProvider(app)
@@ -0,0 +1,153 @@
+"""
+Catalog snapshots: item, character, planet, vehicle and favorite exported to a directory of gzip compressed
+columnar chunks, and loaded back with the fast path of the backend (COPY on Postgres, executemany elsewhere).
+
+    snapshot/manifest.json          tables, columns, row counts and chunk files
+    snapshot/item/00000.json.gz     {"id": [...], "type": [...], "name": [...], ...} for CHUNK_SIZE rows
+
+Both directions read and write one chunk at a time so memory stays bounded whatever the size of the catalog.
+Favorites reference users, which are not part of the snapshot: they must already exist on the target database.
+"""
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+from sqlalchemy import DateTime, select, text
+from models import db, Item, Character, Planet, Vehicle, Favorite, CatalogVersion, ChangeLog, ITEM_SEARCH_SQLITE
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 50000
+# in foreign key order, deletes run in reverse
+TABLES = [Item.__table__, Character.__table__, Planet.__table__, Vehicle.__table__, Favorite.__table__]
+
+
+def chunk_path(table_name, index):
+    return os.path.join(table_name, '%05d.json.gz' % index)
+
+
+def encode_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_snapshot(path, chunk_size=CHUNK_SIZE):
+    os.makedirs(path, exist_ok=True)
+    manifest = {'format': FORMAT_VERSION, 'chunk_size': chunk_size, 'tables': []}
+    connection = db.session.connection().execution_options(stream_results=True, yield_per=chunk_size)
+    for table in TABLES:
+        os.makedirs(os.path.join(path, table.name), exist_ok=True)
+        columns = [column.name for column in table.columns]
+        entry = {'name': table.name, 'columns': columns, 'rows': 0, 'chunks': []}
+        result = connection.execute(select(table).order_by(*table.primary_key.columns))
+        for rows in result.partitions():
+            data = {name: [encode_value(row[index]) for row in rows] for index, name in enumerate(columns)}
+            name = chunk_path(table.name, len(entry['chunks']))
+            with gzip.open(os.path.join(path, name), 'wt', encoding='utf-8', compresslevel=6) as chunk_file:
+                json.dump(data, chunk_file, separators=(',', ':'))
+            entry['chunks'].append(name)
+            entry['rows'] += len(rows)
+        manifest['tables'].append(entry)
+
+    with open(os.path.join(path, 'manifest.json'), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def read_chunks(path, entry, table):
+    datetime_columns = [name for name in entry['columns'] if isinstance(table.c[name].type, DateTime)]
+    for name in entry['chunks']:
+        with gzip.open(os.path.join(path, name), 'rt', encoding='utf-8') as chunk_file:
+            data = json.load(chunk_file)
+        for column in datetime_columns:
+            data[column] = [datetime.fromisoformat(value) if value else value for value in data[column]]
+        yield data
+
+
+# COPY text format: tab separated, \N for NULL, backslash escapes
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_chunk(cursor, table, columns, data):
+    buffer = io.StringIO()
+    for row in zip(*[data[column] for column in columns]):
+        buffer.write('\t'.join(copy_value(value) for value in row) + '\n')
+    buffer.seek(0)
+    cursor.copy_expert('COPY %s (%s) FROM STDIN' % (table.name, ', '.join(columns)), buffer)
+
+
+# On SQLite the FTS5 triggers of item cost more than the inserts themselves, they are dropped for the load and
+# the search index is rebuilt once at the end (ITEM_SEARCH_SQLITE recreates the triggers and runs the rebuild).
+# DROP TRIGGER commits on its own with the sqlite3 driver, a failed load puts them back.
+SQLITE_SEARCH_TRIGGERS = ('item_search_insert', 'item_search_delete', 'item_search_update')
+
+
+def restore_search_index(connection):
+    for statement in ITEM_SEARCH_SQLITE:
+        connection.execute(text(statement))
+
+
+# Loads the snapshot in a single transaction, replace deletes the current rows of the tables first.
+# Returns the number of rows loaded per table.
+def import_snapshot(path, replace=False):
+    with open(os.path.join(path, 'manifest.json')) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError("Unsupported snapshot format: %s" % manifest.get('format'))
+    tables = {table.name: table for table in TABLES}
+    entries = [entry for entry in manifest['tables'] if entry['name'] in tables]
+
+    connection = db.session.connection()
+    sqlite = connection.dialect.name == 'sqlite'
+    if sqlite:
+        for trigger in SQLITE_SEARCH_TRIGGERS:
+            connection.execute(text('DROP TRIGGER IF EXISTS ' + trigger))
+    try:
+        loaded = load_tables(connection, path, entries, tables, replace)
+    except Exception:
+        db.session.rollback()
+        if sqlite:
+            restore_search_index(db.session.connection())
+            db.session.commit()
+        raise
+
+    if sqlite:
+        restore_search_index(connection)
+    CatalogVersion.bump('item', 'character', 'planet', 'vehicle')
+    # the change feed sends the clients to a full download
+    ChangeLog.record('catalog', 'reset')
+    db.session.commit()
+    return loaded
+
+
+def load_tables(connection, path, entries, tables, replace):
+    if replace:
+        for table in reversed(TABLES):
+            connection.execute(table.delete())
+
+    cursor = None
+    if connection.dialect.name == 'postgresql':
+        cursor = connection.connection.cursor()
+        if not hasattr(cursor, 'copy_expert'):
+            cursor = None
+
+    loaded = {}
+    for entry in entries:
+        table = tables[entry['name']]
+        columns = [name for name in entry['columns'] if name in table.c]
+        loaded[table.name] = 0
+        for data in read_chunks(path, entry, table):
+            if cursor is not None:
+                copy_chunk(cursor, table, columns, data)
+            else:
+                connection.execute(table.insert(), [dict(zip(columns, row))
+                                                    for row in zip(*[data[column] for column in columns])])
+            loaded[table.name] += len(data[columns[0]]) if columns else 0
+    return loaded
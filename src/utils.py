@@ -1,3 +1,5 @@
+import base64
+import json
 from flask import jsonify, url_for
 
 class APIException(Exception):
@@ -12,16 +14,53 @@ class APIException(Exception):
 
     def to_dict(self):
         rv = dict(self.payload or ())
-        rv['message'] = self.message
+        # same key as the errors returned by the views
+        rv['error'] = self.message
         return rv
 
+# Cursors are opaque to the clients, they only carry the last key of the previous page
+def encode_cursor(value):
+    raw = json.dumps(value).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except ValueError:
+        raise APIException("Invalid cursor", status_code=400)
+
+def parse_limit(value, default=20, maximum=100):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise APIException("limit must be an integer", status_code=400)
+    if limit < 1:
+        raise APIException("limit must be greater than 0", status_code=400)
+    return min(limit, maximum)
+
+def parse_fields(value, allowed):
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise APIException("Unknown fields: " + ", ".join(unknown), status_code=400)
+    # the id is always returned because the next cursor is built from it
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    # flask-admin registers the 'admin' blueprint, only with ENABLE_ADMIN=1
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
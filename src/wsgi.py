@@ -1,7 +1,12 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
+import os
 
-from app import app as application
+# the workers only serve the API, the admin, migrations and swagger stay available with flask run / flask db
+for name in ("ENABLE_ADMIN", "ENABLE_MIGRATE", "ENABLE_SWAGGER"):
+    os.environ.setdefault(name, "0")
+
+from app import app as application  # noqa: E402
 
 if __name__ == "__main__":
     application.run()
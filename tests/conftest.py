@@ -0,0 +1,77 @@
+"""
+The app reads its configuration when it is imported: a throw away SQLite database, no response cache (the tests
+look at the queries of the views) and none of the dev tools.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE
+os.environ['CACHE_TTL'] = '0'
+for name in ('ENABLE_ADMIN', 'ENABLE_MIGRATE', 'ENABLE_SWAGGER'):
+    os.environ[name] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from sqlalchemy import event  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from models import db, User, Item, Character, Planet, Vehicle, Favorite, CatalogVersion  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Fresh catalog of n characters, planets and vehicles, n users with two favorites each
+@pytest.fixture
+def seed(app):
+    def seed(n):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        for i in range(n):
+            db.session.add(Character(id='character-%04d' % i, name='Luke %d' % i, gender='male',
+                                     birth_year='19BBY', hair_color='blond', eye_color='blue'))
+            db.session.add(Planet(id='planet-%04d' % i, name='Tatooine %d' % i, climate='arid', terrain='desert',
+                                  population=1000 + i, orbital_period=304, rotation_period=23))
+            db.session.add(Vehicle(id='vehicle-%04d' % i, name='Speeder %d' % i, passengers=i,
+                                   cost_in_credits=1000, max_atmosphering_speed=100, crew=1))
+            db.session.add(User(id=i + 1, email='user%d@starwars.com' % i, password='secret',
+                                sub_date='2025-01-01', first_name='User', last_name=str(i)))
+        db.session.flush()
+        for i in range(n):
+            db.session.add(Favorite(user_id=i + 1, item_id='character-%04d' % i))
+            db.session.add(Favorite(user_id=i + 1, item_id='planet-%04d' % i))
+        Item.reconcile_favorite_counts()
+        CatalogVersion.bump('item', 'character', 'planet', 'vehicle')
+        db.session.commit()
+    return seed
+
+
+# (statement, parameters) sent to the database while the block runs: with count_queries() as statements: ...
+@pytest.fixture
+def count_queries(app):
+    class Recorder:
+        def __enter__(self):
+            self.statements = []
+            event.listen(db.engine, 'before_cursor_execute', self.record)
+            return self.statements
+
+        def __exit__(self, *exc_info):
+            event.remove(db.engine, 'before_cursor_execute', self.record)
+
+        def record(self, conn, cursor, statement, parameters, context, executemany):
+            self.statements.append((statement, parameters))
+    return Recorder
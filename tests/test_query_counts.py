@@ -0,0 +1,29 @@
+"""The list endpoints run a fixed number of queries, whatever the number of rows they return."""
+import pytest
+
+LIST_URLS = [
+    '/items',
+    '/items?load=selectin',
+    '/items?load=joined',
+    '/people',
+    '/planets',
+    '/vehicles',
+    '/users?include=favorites',
+]
+
+
+def queries_for(client, count_queries, url):
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', LIST_URLS)
+def test_list_queries_do_not_grow_with_rows(client, seed, count_queries, url):
+    seed(10)
+    small = queries_for(client, count_queries, url)
+    seed(100)
+    large = queries_for(client, count_queries, url)
+    assert small > 0
+    assert large == small, "%s: %d queries with 10 rows per table, %d with 100" % (url, small, large)
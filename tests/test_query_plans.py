@@ -0,0 +1,65 @@
+"""
+The hot reads are served by their indexes (EXPLAIN QUERY PLAN on SQLite): the favorites of a user, the keyset pages
+of one item type, the name search and the change feed of a user. None of them scans the item table.
+"""
+import re
+from datetime import timedelta
+
+import pytest
+from models import db, ChangeLog, utcnow
+
+FULL_SCAN = re.compile(r'^SCAN (item|favorite|change_log)\b')
+
+
+def plans_for(client, count_queries, url):
+    with count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    connection = db.session.connection()
+    plans = []
+    for statement, parameters in statements:
+        if statement.lstrip().upper().startswith('SELECT'):
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            plans.extend(row[3] for row in rows)
+    return response, plans
+
+
+def assert_uses(plans, index):
+    assert any(index in detail for detail in plans), plans
+    assert not [detail for detail in plans if FULL_SCAN.match(detail)], plans
+
+
+@pytest.fixture
+def catalog(seed):
+    seed(200)
+
+
+def test_favorites_by_user_use_the_user_index(client, catalog, count_queries):
+    response, plans = plans_for(client, count_queries, '/users/3/favorites')
+    assert response.get_json()
+    assert_uses(plans, 'ix_favorite_user_id')
+
+
+@pytest.mark.parametrize('item_type', ['character', 'planet', 'vehicle'])
+def test_type_filtered_keyset_page_uses_the_type_index(client, catalog, count_queries, item_type):
+    first = client.get('/items?type=%s&limit=10' % item_type).get_json()
+    response, plans = plans_for(client, count_queries, '/items?type=%s&limit=10&after=%s' % (item_type, first['next']))
+    assert len(response.get_json()['results']) == 10
+    assert_uses(plans, 'ix_item_type (type=? AND id>?)')
+
+
+def test_name_search_uses_the_full_text_index(client, catalog, count_queries):
+    response, plans = plans_for(client, count_queries, '/items?search=tatooine%2012')
+    assert response.get_json()
+    assert_uses(plans, 'item_search VIRTUAL TABLE')
+
+
+def test_changes_of_a_user_use_the_user_index(client, catalog, count_queries):
+    since = client.get('/changes?since=latest').get_json()['next']
+    for user_id in (None, 3, 4):
+        ChangeLog.record('favorite' if user_id else 'item', 'upsert', ['planet-0001'], user_id)
+    db.session.execute(db.update(ChangeLog).values(created_at=utcnow() - timedelta(minutes=1)))
+    db.session.commit()
+    response, plans = plans_for(client, count_queries, '/changes?user_id=3&since=' + since)
+    assert [change.get('user_id') for change in response.get_json()['changes']] == [None, 3]
+    assert_uses(plans, 'ix_change_log_user_id (user_id=? AND id>?)')